@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Benchmark extrakcie ponúk obchodov na uložených kupi.cz stránkach.
+Porovná pôvodnú extrakciu (regex na každý obchod) s jednoprechodovou a overí zhodný výstup.
+Predvolene beží na syntetických stránkach z tests/fixtures a dvoch veľkých generovaných (fixture_pages.SYNTHETIC_PAGES),
+kde sa prejaví spätné prehľadávanie pôvodných regexov (stovky ponúk, stovky odkazov na obchody pred nimi).
+
+    python scraper/bench_extract.py                      # tests/fixtures + generované veľké stránky
+    python scraper/bench_extract.py scraper/.http_cache  # stránky z HTTP cache
+    python scraper/bench_extract.py page1.html dir/      # vlastné HTML súbory
+"""
+
+import glob
+import os
+import sys
+import timeit
+
+from bs4 import BeautifulSoup
+
+from fixture_pages import FIXTURES_DIR, kupi_pages, load_pages as load_recorded, synthetic_pages
+from kupi_scraper import _extract_offers_legacy, extract_store_offers
+
+def load_pages(paths):
+    pages = [] if paths else sorted(synthetic_pages().items())
+    for path in paths or [FIXTURES_DIR]:
+        if os.path.isfile(path):
+            with open(path, "rb") as f: pages.append((os.path.basename(path), f.read()))
+            continue
+        pages.extend(sorted(kupi_pages(load_recorded(path)).items()))
+        for hp in sorted(glob.glob(os.path.join(path, "*.html"))):
+            with open(hp, "rb") as f: pages.append((os.path.basename(hp), f.read()))
+    return pages
+
+def main(paths, repeat=20):
+    pages = load_pages(paths)
+    if not pages:
+        print("⚠ žiadne uložené kupi.cz stránky")
+        return 1
+    tot_old = tot_new = 0.0
+    diffs = 0
+    print(f"{'stránka':40} {'kB':>6} {'pred [ms]':>10} {'po [ms]':>10} {'zrýchlenie':>10}")
+    for name, body in pages:
+        text = BeautifulSoup(body, "html.parser").get_text()
+        if _extract_offers_legacy(text) != extract_store_offers(text):
+            diffs += 1
+            print(f"  ❌ {name}: rozdielny výstup")
+        t_old = min(timeit.repeat(lambda: _extract_offers_legacy(text), number=1, repeat=repeat)) * 1000
+        t_new = min(timeit.repeat(lambda: extract_store_offers(text), number=1, repeat=repeat)) * 1000
+        tot_old += t_old
+        tot_new += t_new
+        print(f"{name[:40]:40} {len(body) / 1024:6.0f} {t_old:10.3f} {t_new:10.3f} {t_old / max(t_new, 1e-9):9.1f}×")
+    print(f"\n{len(pages)} stránok: pred {tot_old / len(pages):.3f} ms/stránka, po {tot_new / len(pages):.3f} ms/stránka, rozdielov: {diffs}")
+    return 1 if diffs else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark scrapera: scrape_kupi_sleva, cross_verify a save_results nad stránkami z tests/fixtures (syntetické, viď fixture_pages.py).
+Stránky (tests/fixtures, alebo --fixtures s adresárom HTTP cache) servíruje lokálny HTTP server, reálne weby sa nevolajú.
+Ak scraper požiada o stránku, ktorá vo fixtures nie je (404), alebo z kupi.cz stránky nevytiahne názov, skončí s chybou.
+Rovnaké merania ako pytest-benchmark: `pytest tests/test_bench_scraper.py`.
+
+    python scraper/bench_scraper.py --json bench.json
+    python scraper/bench_scraper.py --baseline bench.json --tolerance 0.25   # exit 1 pri regresii
+"""
+
+import contextlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import kupi_scraper as ks
+from fixture_pages import FIXTURES_DIR, kupi_pages, load_pages, point_scraper_at, search_queries, serve
+
+def build_product(d):
+    c = ks.get_clean_category(d["name"])
+    score, bio = ks.get_bio_audit(d["name"], c)
+    return {"name": d["name"], "slug": d["slug"], "category": c, "is_priority": ks.is_priority(d["name"]),
+            "regular_price": d["regular_price"], "best_price": d["best_price"], "max_discount": d["max_discount"], "offers": d["offers"],
+            "clean_score": score, "bio_audit": bio, "nutrition": ks.get_nutrition(d["name"]),
+            "source_url": d["url"], "sources_checked": ["kupi.cz"], "verification": None, "scraped_at": "bench"}
+
+def timed(fn, rounds):
+    times = []
+    for _ in range(rounds):
+        ks._verify_memo.clear()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {"rounds": rounds, "min_ms": round(min(times) * 1000, 3), "median_ms": round(statistics.median(times) * 1000, 3)}
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="adresár s manifest.json alebo v tvare HTTP cache (*.json + *.body)")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--json", help="uložiť výsledky (použiteľné ako --baseline)")
+    parser.add_argument("--baseline", help="porovnať mediány s predošlým --json výstupom")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    pages = load_pages(args.fixtures)
+    slugs = sorted(kupi_pages(pages))
+    queries = search_queries(pages)
+    if not slugs:
+        print(f"⚠ žiadne kupi.cz stránky v {args.fixtures}")
+        return 1
+    srv = serve(pages)
+    saved = point_scraper_at(srv)
+    try:
+        scraped = [ks.scrape_kupi_sleva(s) for s in slugs]
+        missing = [d["slug"] for d in scraped if not d["name"]]
+        if missing or srv.misses:
+            for s in missing: print(f"  ❌ {s}: stránka nevrátila názov produktu")
+            for path in srv.misses: print(f"  ❌ 404 {path}")
+            return 1
+        products = [build_product(d) for d in scraped]
+        ks.METRICS.reset()
+        with tempfile.TemporaryDirectory(prefix="bench_") as out_dir, open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            results = {
+                "scrape_kupi_sleva": timed(lambda: [ks.scrape_kupi_sleva(s) for s in slugs], args.rounds),
+                "cross_verify": timed(lambda: [ks.cross_verify(q, 100.0) for q in queries], args.rounds),
+                "save_results": timed(lambda: ks.save_results(products, out_dir, history=False), args.rounds),
+            }
+    finally:
+        srv.shutdown()
+        ks.BASE_URLS.update(saved)
+    if srv.misses:
+        for path in sorted(set(srv.misses)): print(f"  ❌ 404 {path}")
+        return 1
+    report = {"fixtures": {"kupi_pages": len(slugs), "search_queries": len(queries)}, "benchmarks": results, "metrics": ks.METRICS.to_dict()}
+
+    print(f"\n{'benchmark':20} {'min [ms]':>10} {'median [ms]':>12}")
+    for name, r in results.items():
+        print(f"{name:20} {r['min_ms']:10.2f} {r['median_ms']:12.2f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f: base = json.load(f)["benchmarks"]
+        slow = [n for n, r in results.items() if n in base and r["median_ms"] > base[n]["median_ms"] * (1 + args.tolerance)]
+        for n in slow: print(f"  ❌ {n}: {results[n]['median_ms']:.2f} ms vs baseline {base[n]['median_ms']:.2f} ms")
+        return 1 if slow else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
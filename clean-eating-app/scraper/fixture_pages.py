@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Stránky pre benchmarky a testy (tests/fixtures: manifest.json url → súbor).
+Commitnuté fixtures sú syntetické (ručne zostavené podľa štruktúry kupi.cz / iLetaky / AkcniCeny), nie nahraté odpovede;
+`record` ich doplní/nahradí skutočnými stránkami z adresára v tvare HTTP cache (*.json + *.body), ktorý vie aj priamo načítať.
+synthetic_kupi_page() generuje veľké stránky (stovky ponúk, opakované odkazy na obchody) pre benchmark extrakcie.
+serve() ich servíruje lokálnym HTTP serverom (s ETag a 304), point_scraper_at() naň presmeruje kupi_scraper (reálne weby sa nevolajú).
+
+    python scraper/fixture_pages.py record scraper/.http_cache          # doplní tests/fixtures
+    python scraper/fixture_pages.py record scraper/.http_cache --out dir
+"""
+
+import glob
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "fixtures")
+DEFAULT_TYPE = "text/html; charset=utf-8"
+
+def _load_manifest(path):
+    with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f: manifest = json.load(f)
+    pages = {}
+    for url, fp in manifest.items():
+        with open(os.path.join(path, fp), "rb") as f: pages[url] = (DEFAULT_TYPE, f.read())
+    return pages
+
+def _load_cache(path):
+    pages = {}
+    for mp in sorted(glob.glob(os.path.join(path, "*.json"))):
+        try:
+            with open(mp, encoding="utf-8") as f: meta = json.load(f)
+            with open(mp[:-5] + ".body", "rb") as f: body = f.read()
+        except (OSError, ValueError):
+            continue
+        if "url" in meta and meta.get("status", 200) == 200:
+            pages[meta["url"]] = (meta.get("content_type") or DEFAULT_TYPE, body)
+    return pages
+
+def load_pages(path=FIXTURES_DIR):
+    if os.path.exists(os.path.join(path, "manifest.json")): return _load_manifest(path)
+    return _load_cache(path)
+
+def kupi_pages(pages):
+    return {url.rsplit("/", 1)[-1]: body for url, (_, body) in pages.items() if "kupi.cz/sleva/" in url}
+
+_SHOPS = ["Lidl", "Kaufland", "Penny Market", "Billa", "Albert"]
+_DAYS = ["pondělí", "úterý", "středa", "čtvrtek", "pátek", "sobota", "neděle"]
+
+def _czk(x):
+    return f"{x:.2f}".replace(".", ",")
+
+def synthetic_kupi_page(offers=300, nav_links=0, seed=0):
+    # offers riadkov ponúk (niektoré bez „cena“/jednotky/platnosti) a pred nimi nav_links odkazov na obchody
+    rnd = random.Random(seed)
+    nav = "".join(f'<li><a href="/obchod/{s.lower()}">{s}</a> letáky, akce a slevy</li>' for s in (_SHOPS * (nav_links // len(_SHOPS) + 1))[:nav_links])
+    rows = []
+    for i in range(offers):
+        shop, price = rnd.choice(_SHOPS), rnd.uniform(9, 400)
+        unit = f'<span class="unit-price">{_czk(price * rnd.choice([2, 4, 10]))} Kč / {rnd.choice(["1 kg", "100 g", "1 l", "1 ks"])}</span>' if rnd.random() < 0.6 else ""
+        cena = f"cena {_czk(price)} Kč" if rnd.random() < 0.8 else f"{_czk(price)} Kč"
+        valid = f"platí do {rnd.choice(_DAYS)} {rnd.randint(1, 28)}. {rnd.randint(1, 12)}." if rnd.random() < 0.7 else "platí jen dnes"
+        rows.append(f'<div class="offer-row"><span class="shop-name">{shop}</span><span class="price">{cena}</span>{unit}'
+                    f'<span class="discount">–{rnd.randint(5, 50)} %</span><span class="validity">{valid}</span>'
+                    f'<p class="offer-note">Produkt č. {i}: akční nabídka z aktuálního letáku, dokud zásoby stačí.</p></div>')
+    return (f'<!DOCTYPE html><html lang="cs"><head><meta charset="utf-8"><title>Slevy | Kupi.cz</title></head><body>'
+            f'<nav class="shops-menu"><ul>{nav}</ul></nav><main><h1>Syntetická stránka ({offers} ponúk)</h1>'
+            f'<p>Zboží běžně stojí {_czk(rnd.uniform(50, 500))} Kč. Nejvýhodněji za {_czk(rnd.uniform(9, 50))} Kč.</p>'
+            f'<section class="discounts-list">{"".join(rows)}</section></main></body></html>').encode("utf-8")
+
+SYNTHETIC_PAGES = {"synthetic-300-offers": {"offers": 300}, "synthetic-nav-600": {"offers": 40, "nav_links": 600}}
+
+def synthetic_pages():
+    return {name: synthetic_kupi_page(**kw) for name, kw in SYNTHETIC_PAGES.items()}
+
+def search_queries(pages):
+    return sorted({parse_qs(urlparse(url).query).get("q", [""])[0] for url in pages if "/hledani/" in url} - {""})
+
+def serve(pages):
+    by_path = {}
+    for url, page in pages.items():
+        u = urlparse(url)
+        by_path["/" + u.netloc + u.path + ("?" + u.query if u.query else "")] = page
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            page = by_path.get(self.path)
+            if page is None: srv.misses.append(self.path)
+            etag = page and f'"{hashlib.sha1(page[1]).hexdigest()}"'
+            status = 404 if page is None else (304 if self.headers.get("If-None-Match") == etag else 200)
+            srv.log.append((self.path, status))
+            self.send_response(status)
+            body = page[1] if status == 200 else b""
+            self.send_header("Content-Type", page[0] if page else "text/plain")
+            if etag: self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    srv.misses, srv.log = [], []
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+def point_scraper_at(srv):
+    import kupi_scraper as ks
+    saved = dict(ks.BASE_URLS)
+    host = f"127.0.0.1:{srv.server_address[1]}"
+    for key, base in saved.items():
+        ks.BASE_URLS[key] = f"http://{host}/{urlparse(base).netloc}"
+    ks.set_host_limit(host, rps=0, concurrency=64)
+    ks.configure_cache(None)
+    return saved
+
+def _file_name(url):
+    u = urlparse(url)
+    if "/sleva/" in u.path: return f"kupi/{u.path.rsplit('/', 1)[-1]}.html"
+    q = re.sub(r'\W+', "-", unquote(u.query.partition("q=")[2]).lower()).strip("-")
+    return f"search/{u.netloc.split('.')[-2]}-{q or 'index'}.html"
+
+def record(cache_dir, out=FIXTURES_DIR):
+    manifest_fp = os.path.join(out, "manifest.json")
+    try:
+        with open(manifest_fp, encoding="utf-8") as f: manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    for url, (_, body) in _load_cache(cache_dir).items():
+        if "/sleva/" not in url and "/hledani/" not in url: continue
+        fp = manifest.get(url) or _file_name(url)
+        os.makedirs(os.path.dirname(os.path.join(out, fp)), exist_ok=True)
+        with open(os.path.join(out, fp), "wb") as f: f.write(body)
+        manifest[url] = fp
+    with open(manifest_fp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    return manifest
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("record", help="skopírovať kupi.cz a vyhľadávacie stránky z HTTP cache")
+    r.add_argument("cache_dir")
+    r.add_argument("--out", default=FIXTURES_DIR)
+    args = parser.parse_args()
+    print(f"✅ {len(record(args.cache_dir, args.out))} stránok v {args.out}")
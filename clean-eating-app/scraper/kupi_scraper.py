@@ -12,29 +12,265 @@ from datetime import datetime, date, timedelta
 from typing import Optional, Dict, List, Tuple
 import time
 import os
+import threading
+import hashlib
+from bisect import bisect_left
+from collections import deque
+from functools import lru_cache
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+
+try:
+    import lxml.html
+    from lxml import etree
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
 
 STORES = {"lidl": "Lidl", "kaufland": "Kaufland", "penny-market": "Penny Market", "billa": "Billa", "albert": "Albert"}
 FLYER_CYCLES = {"Lidl": {"start_day": 0, "duration": 7}, "Kaufland": {"start_day": 3, "duration": 7}, "Penny Market": {"start_day": 2, "duration": 7}, "Billa": {"start_day": 2, "duration": 7}, "Albert": {"start_day": 2, "duration": 7}}
 
 BANNED_KEYWORDS = ["párky","párků","párek","klobás","salám","šunk","paštik","paštět","špekáč","vuřt","buřt","slanin","mortadel","kabanos","jaternic","tlačenk","jelít","utopen","vysočin","gothaj","debrecín","piken","hot dog","bacon","chorizo","prosciutt","pancetta","čokolád","sušenk","oplatk","chips","brambůrk","tyčink","bonbon","želé","gumov","drops","karamel","nugát","müsli tyčink","proteinov","fitness tyčink","hotové jídlo","pizza","lasagn","burger","nugget","kroket","hranolk","smažen","obalovan","předsmažen","kečup","tatarsk","majonéz","dresing","limonád","cola","fant","sprite","energetick","energy","zmrzlin","nanuk","sorbet","toast","bageta","croissant","instantní","polévka sáčk","bujón"]
 PRIORITY_KEYWORDS = ["kuřecí prsní","kuřecí prsa","kuře celé","krůtí","losos","tuňák","treska","tvaroh","jogurt řecký","skyr","cottage","vejce","brokolice","špenát","rajčata","borůvk","ovesné vločky","čočka","mandle","olivový olej","avokádo","batáty"]
+CATEGORY_KEYWORDS = {"meat": ["kuřecí","krůtí","hovězí","vepřov","telecí","jehněčí","kachní","kuře"], "fish": ["losos","tuňák","tresk","pstruh","makrela","filé","ryb"], "dairy": ["tvaroh","jogurt","skyr","mozzarell","cottage","vejce","vajec","máslo","sýr","eidam","gouda","mléko","smetana","kefír"], "produce": ["jablk","banán","pomeranč","rajčat","paprik","okurk","mrkev","brokolice","špenát","květák","cuketa","borůvk","malín","hrozn","citron","kiwi","mango","avokád","celer","zelení","cibule","česnek","batát"], "pantry": ["olivový","rýže","čočk","fazol","hrách","cizrn","ovesné","pohanka","ořech","mandle","vlašsk","konzerv","těstovin","med"]}
 
 HEADERS = {"User-Agent": "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15", "Accept": "text/html,application/xhtml+xml", "Accept-Language": "cs-CZ,cs;q=0.9"}
+BASE_URLS = {"kupi": "https://www.kupi.cz", "iletaky": "https://www.iletaky.cz", "akcniceny": "https://www.akcniceny.cz"}
+# šetrné predvolené hodnoty (pôvodne 0,5 s medzi kupi.cz a 0,3 s medzi overovacími požiadavkami); zvýšiť cez --host-limit
+HOST_LIMITS = {"www.kupi.cz": {"rps": 2.0, "concurrency": 2}, "www.iletaky.cz": {"rps": 3.0, "concurrency": 2}, "www.akcniceny.cz": {"rps": 3.0, "concurrency": 2}}
+DEFAULT_HOST_LIMIT = {"rps": 1.0, "concurrency": 1}
 
-def is_clean(name):
-    nl = name.lower()
-    return not any(b in nl for b in BANNED_KEYWORDS)
+# ============================================================
+# METRICS (čas po fázach, bajty, latencie po hostoch)
+# ============================================================
+# stages: disjunktná práca (sieť, čakanie na limit, parse, extrakcia, klasifikácia, serializácia, história), sčítaná cez vlákna,
+#         takže súčet môže prekročiť wall_seconds; fázy sa nevnárajú.
+# waits:  koľko hlavné vlákno čakalo na kupi.cz stránky / cross-verifikáciu; prekrýva sa so stages z pracovných vlákien.
 
-def is_priority(name):
-    nl = name.lower()
-    return any(k.lower() in nl for k in PRIORITY_KEYWORDS)
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2000, 5000]
 
-def get_clean_category(name):
-    nl = name.lower()
-    cats = {"meat": ["kuřecí","krůtí","hovězí","vepřov","telecí","jehněčí","kachní","kuře"], "fish": ["losos","tuňák","tresk","pstruh","makrela","filé","ryb"], "dairy": ["tvaroh","jogurt","skyr","mozzarell","cottage","vejce","vajec","máslo","sýr","eidam","gouda","mléko","smetana","kefír"], "produce": ["jablk","banán","pomeranč","rajčat","paprik","okurk","mrkev","brokolice","špenát","květák","cuketa","borůvk","malín","hrozn","citron","kiwi","mango","avokád","celer","zelení","cibule","česnek","batát"], "pantry": ["olivový","rýže","čočk","fazol","hrách","cizrn","ovesné","pohanka","ořech","mandle","vlašsk","konzerv","těstovin","med"]}
-    for cat, kws in cats.items():
-        if any(kw in nl for kw in kws): return cat
-    return "other"
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.perf_counter()
+            self.stages = {}
+            self.waits = {}
+            self.hosts = {}
+
+    @contextmanager
+    def _timed(self, bucket, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            dt = time.perf_counter() - t0
+            with self.lock:
+                st = bucket.setdefault(name, {"seconds": 0.0, "calls": 0})
+                st["seconds"] += dt
+                st["calls"] += 1
+
+    def stage(self, name):
+        return self._timed(self.stages, name)
+
+    def wait(self, name):
+        return self._timed(self.waits, name)
+
+    def _host(self, host):
+        return self.hosts.setdefault(host, {"requests": 0, "bytes": 0, "cache_hits": 0, "not_modified": 0, "errors": 0, "wait_seconds": 0.0, "latency_seconds": 0.0, "latency_ms": {str(b): 0 for b in LATENCY_BUCKETS_MS + ["inf"]}})
+
+    def request(self, host, wait, latency, nbytes, status):
+        ms = latency * 1000
+        with self.lock:
+            for name, dt in (("network", latency), ("rate_limit_wait", wait)):
+                st = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+                st["seconds"] += dt
+                st["calls"] += 1
+            h = self._host(host)
+            h["requests"] += 1
+            h["bytes"] += nbytes
+            h["wait_seconds"] += wait
+            h["latency_seconds"] += latency
+            if status == 304: h["not_modified"] += 1
+            elif status != 200: h["errors"] += 1
+            h["latency_ms"][str(next((b for b in LATENCY_BUCKETS_MS if ms <= b), "inf"))] += 1
+
+    def cache_hit(self, host):
+        with self.lock: self._host(host)["cache_hits"] += 1
+
+    def to_dict(self):
+        with self.lock:
+            return {"generated_at": datetime.now().isoformat(), "wall_seconds": round(time.perf_counter() - self.started, 3),
+                    "stages": {k: {"seconds": round(v["seconds"], 4), "calls": v["calls"]} for k, v in self.stages.items()},
+                    "waits": {k: {"seconds": round(v["seconds"], 4), "calls": v["calls"]} for k, v in self.waits.items()},
+                    "hosts": {k: dict(v, wait_seconds=round(v["wait_seconds"], 4), latency_seconds=round(v["latency_seconds"], 4), latency_ms=dict(v["latency_ms"])) for k, v in self.hosts.items()}}
+
+METRICS = Metrics()
+
+# ============================================================
+# FETCH ENGINE (per-host rate limit + concurrency cap)
+# ============================================================
+
+class HostLimiter:
+    def __init__(self, rps, concurrency):
+        self.interval = 1.0 / rps if rps > 0 else 0.0
+        self.slots = threading.BoundedSemaphore(max(int(concurrency), 1))
+        self.lock = threading.Lock()
+        self.next_at = 0.0
+
+    def __enter__(self):
+        self.slots.acquire()
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_at)
+            self.next_at = start + self.interval
+        if start > now: time.sleep(start - now)
+        return self
+
+    def __exit__(self, *exc):
+        self.slots.release()
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def host_limit(host):
+    return HOST_LIMITS.get(host, DEFAULT_HOST_LIMIT)
+
+def get_limiter(host):
+    with _limiters_lock:
+        if host not in _limiters:
+            lim = host_limit(host)
+            _limiters[host] = HostLimiter(lim["rps"], lim["concurrency"])
+        return _limiters[host]
+
+def set_host_limit(host, rps=None, concurrency=None):
+    lim = dict(host_limit(host))
+    if rps is not None: lim["rps"] = float(rps)
+    if concurrency is not None: lim["concurrency"] = int(concurrency)
+    HOST_LIMITS[host] = lim
+    with _limiters_lock: _limiters.pop(host, None)
+
+def parse_host_limit(spec):
+    # "HOST=RPS:CONC", "HOST=RPS" alebo "HOST=:CONC"; RPS 0 = bez limitu požiadaviek/s
+    host, eq, val = spec.partition("=")
+    rps, _, conc = val.partition(":")
+    if not eq or not host.strip() or not (rps or conc): raise ValueError(f"--host-limit {spec!r}: očakávam HOST=RPS:CONC")
+    try:
+        rps = float(rps) if rps else None
+        conc = int(conc) if conc else None
+    except ValueError:
+        raise ValueError(f"--host-limit {spec!r}: RPS musí byť číslo a CONC celé číslo") from None
+    if (rps is not None and rps < 0) or (conc is not None and conc < 1): raise ValueError(f"--host-limit {spec!r}: RPS >= 0, CONC >= 1")
+    return host.strip(), rps, conc
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update(HEADERS)
+            pool = max([l["concurrency"] for l in HOST_LIMITS.values()] + [DEFAULT_HOST_LIMIT["concurrency"]])
+            adapter = HTTPAdapter(pool_connections=len(HOST_LIMITS) + 1, pool_maxsize=pool)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+# ============================================================
+# RESPONSE CACHE (ETag/Last-Modified + TTL do zmeny letáku)
+# ============================================================
+
+class ResponseCache:
+    def __init__(self, path, offline=False):
+        self.path = path
+        self.offline = offline
+        os.makedirs(path, exist_ok=True)
+
+    def _files(self, url):
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.path, key + ".json"), os.path.join(self.path, key + ".body")
+
+    def load(self, url):
+        mp, bp = self._files(url)
+        try:
+            with open(mp, encoding="utf-8") as f: meta = json.load(f)
+            with open(bp, "rb") as f: body = f.read()
+        except (OSError, ValueError):
+            return None, None
+        return meta, body
+
+    def store(self, url, resp, expires_at):
+        mp, bp = self._files(url)
+        meta = {"url": url, "status": resp.status_code, "etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified"), "content_type": resp.headers.get("Content-Type"), "encoding": resp.encoding, "fetched_at": datetime.now().isoformat(), "expires_at": expires_at.isoformat()}
+        for fp, data, mode in ((bp, resp.content, "wb"), (mp, json.dumps(meta, ensure_ascii=False).encode("utf-8"), "wb")):
+            tmp = f"{fp}.{threading.get_ident()}.tmp"
+            with open(tmp, mode) as f: f.write(data)
+            os.replace(tmp, fp)
+
+    def touch(self, url, meta, expires_at):
+        mp, _ = self._files(url)
+        meta = dict(meta, fetched_at=datetime.now().isoformat(), expires_at=expires_at.isoformat())
+        tmp = f"{mp}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f: json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, mp)
+
+def _cached_response(url, meta, body):
+    r = requests.models.Response()
+    r.status_code = meta.get("status", 200)
+    r.url = url
+    r._content = body
+    r.encoding = meta.get("encoding")
+    r.headers.update({k: v for k, v in (("ETag", meta.get("etag")), ("Last-Modified", meta.get("last_modified")), ("Content-Type", meta.get("content_type"))) if v})
+    return r
+
+_cache = None
+
+def configure_cache(path, offline=False):
+    global _cache
+    _cache = ResponseCache(path, offline=offline) if path else None
+    if offline and _cache is None: raise ValueError("--offline vyžaduje cache adresár")
+    return _cache
+
+def fetch(url, timeout=15):
+    host = urlparse(url).netloc
+    meta, body = _cache.load(url) if _cache else (None, None)
+    if _cache and _cache.offline:
+        if meta is None:
+            r = requests.models.Response()
+            r.status_code, r.url, r._content = 504, url, b""
+            return r
+        METRICS.cache_hit(host)
+        return _cached_response(url, meta, body)
+    if meta is not None and meta.get("expires_at", "") > datetime.now().isoformat():
+        METRICS.cache_hit(host)
+        return _cached_response(url, meta, body)
+    headers = {}
+    if meta is not None:
+        if meta.get("etag"): headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"): headers["If-Modified-Since"] = meta["last_modified"]
+    t0 = time.perf_counter()
+    with get_limiter(host):
+        t1 = time.perf_counter()
+        try:
+            resp = get_session().get(url, headers=headers, timeout=timeout)
+        except Exception:
+            METRICS.request(host, t1 - t0, time.perf_counter() - t1, 0, None)
+            raise
+        METRICS.request(host, t1 - t0, time.perf_counter() - t1, len(resp.content), resp.status_code)
+    if _cache is None: return resp
+    if resp.status_code == 304 and meta is not None:
+        _cache.touch(url, meta, next_flyer_change())
+        return _cached_response(url, meta, body)
+    if resp.status_code == 200:
+        _cache.store(url, resp, next_flyer_change())
+    return resp
 
 def get_validity_dates(store_name):
     today = date.today()
@@ -44,6 +280,15 @@ def get_validity_dates(store_name):
     end = start + timedelta(days=cycle["duration"] - 1)
     return start.isoformat(), end.isoformat()
 
+def next_flyer_change(now=None):
+    now = now or datetime.now()
+    today = now.date()
+    starts = []
+    for cycle in FLYER_CYCLES.values():
+        days_ahead = (cycle["start_day"] - today.weekday()) % 7 or 7
+        starts.append(today + timedelta(days=days_ahead))
+    return datetime.combine(min(starts), datetime.min.time())
+
 # ============================================================
 # BIO AUDIT + NUTRITION
 # ============================================================
@@ -57,106 +302,470 @@ BIO = {
 
 NUTRI = {"kuřecí prs": (110,23.1,0,1.2,0), "kuře cel": (167,20,0,9.3,0), "kuřecí steh": (177,18.2,0,11.2,0), "krůtí": (104,24.6,0,0.7,0), "hovězí": (250,26,0,15,0), "vepřov": (186,18.5,0,12.2,0), "mlet": (145,20,0,7,0), "losos": (208,20.4,0,13.4,0), "tuňák": (116,25.5,0,1,0), "tresk": (82,17.6,0,0.7,0), "pstruh": (119,20.5,0,3.5,0), "tvaroh": (130,12.8,3.1,7.5,0), "jogurt": (72,3.5,4.8,3.8,0), "řecký": (97,9,3.5,5,0), "vejce": (143,12.6,0.7,9.9,0), "mozzarell": (254,18.5,1,19.5,0), "máslo": (717,0.6,0.8,81,0), "cottage": (98,11,3.3,4,0), "skyr": (63,11,4,0.2,0), "kefír": (56,3.3,4.7,1.5,0), "jablk": (52,0.3,13.8,0.2,2.4), "banán": (89,1.1,22.8,0.3,2.6), "pomeranč": (47,0.9,11.8,0.1,2.4), "rajčat": (18,0.9,3.9,0.2,1.2), "paprik": (31,1,6,0.3,2.1), "brokolice": (34,2.8,7,0.4,2.6), "špenát": (23,2.9,3.6,0.4,2.2), "mrkev": (41,0.9,9.6,0.2,2.8), "okurk": (15,0.7,3.6,0.1,0.5), "avokád": (160,2,9,15,6.7), "cibule": (40,1.1,9.3,0.1,1.7), "česnek": (149,6.4,33.1,0.5,2.1), "borůvk": (57,0.7,14.5,0.3,2.4), "kiwi": (63,1.1,15.4,0.3,2), "hrozn": (69,0.7,18.1,0.2,0.9), "cuketa": (17,1.2,3.1,0.3,1), "olivový": (884,0,0,100,0), "ovesné": (372,13.5,58.7,7,10.6), "rýže": (350,7,78,0.6,1), "čočk": (353,25.4,60.1,1.1,10.7), "mandle": (576,21.2,21.7,49.4,12.2), "těstovin": (348,13.5,65,2.5,7.5), "fazol": (81,4.6,12.9,0.5,3.7), "med": (304,0.3,76,0,0), "ořech": (654,15,14,65,6.7)}
 
+# ============================================================
+# KEYWORD MATCHER (Aho-Corasick, jeden prechod názvom)
+# ============================================================
+
+class KeywordMatcher:
+    def __init__(self, keywords):
+        self.goto, self.fail, self.out = [{}], [0], [()]
+        for kw in dict.fromkeys(keywords):
+            s = 0
+            for ch in kw:
+                nxt = self.goto[s].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[s][ch] = nxt
+                    self.goto.append({}); self.fail.append(0); self.out.append(())
+                s = nxt
+            self.out[s] += (kw,)
+        queue = deque(self.goto[0].values())
+        while queue:
+            s = queue.popleft()
+            for ch, nxt in self.goto[s].items():
+                queue.append(nxt)
+                f = self.fail[s]
+                while f and ch not in self.goto[f]: f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] += self.out[self.fail[nxt]]
+
+    def scan(self, text):
+        goto, fail, out = self.goto, self.fail, self.out
+        s, hits = 0, set()
+        for ch in text:
+            while s and ch not in goto[s]: s = fail[s]
+            s = goto[s].get(ch, 0)
+            if out[s]: hits.update(out[s])
+        return frozenset(hits)
+
+def _ranks(keywords):
+    r = {}
+    for i, kw in enumerate(keywords): r.setdefault(kw, i)
+    return r
+
+_BANNED = _ranks(BANNED_KEYWORDS)
+_PRIORITY = _ranks(k.lower() for k in PRIORITY_KEYWORDS)
+_CATEGORY_OF = {}
+for _i, (_cat, _kws) in enumerate(CATEGORY_KEYWORDS.items()):
+    for _kw in _kws: _CATEGORY_OF.setdefault(_kw, (_i, _cat))
+_BIO_RANKS = {cat: _ranks(tpls) for cat, tpls in BIO.items()}
+_NUTRI = _ranks(NUTRI)
+MATCHER = KeywordMatcher(list(_BANNED) + list(_PRIORITY) + list(_CATEGORY_OF) + [kw for r in _BIO_RANKS.values() for kw in r] + list(_NUTRI))
+
+@lru_cache(maxsize=16384)
+def keyword_hits(name):
+    return MATCHER.scan(name.lower())
+
+def _first(hits, ranks):
+    return min((h for h in hits if h in ranks), key=ranks.__getitem__, default=None)
+
+def is_clean(name):
+    return keyword_hits(name).isdisjoint(_BANNED)
+
+def is_priority(name):
+    return not keyword_hits(name).isdisjoint(_PRIORITY)
+
+def get_clean_category(name):
+    return min((_CATEGORY_OF[h] for h in keyword_hits(name) if h in _CATEGORY_OF), default=(0, "other"))[1]
+
+def classify(name):
+    hits = keyword_hits(name)
+    cat = get_clean_category(name)
+    return {"name": name, "banned": _first(hits, _BANNED), "priority": not hits.isdisjoint(_PRIORITY), "category": cat, "bio": _first(hits, _BIO_RANKS.get(cat, {})), "nutrition": _first(hits, _NUTRI)}
+
+def classify_many(names):
+    return [classify(n) for n in names]
+
 def get_bio_audit(name, cat):
-    nl = name.lower()
-    tpls = BIO.get(cat, {})
-    for kw, d in tpls.items():
-        if kw in nl:
-            return d[0], {"microbiome": {"score": d[1], "detail": d[4]}, "cardiovascular": {"score": d[2], "detail": d[5]}, "metabolism": {"score": d[3], "detail": d[6]}}
+    kw = _first(keyword_hits(name), _BIO_RANKS.get(cat, {}))
+    if kw is not None:
+        d = BIO[cat][kw]
+        return d[0], {"microbiome": {"score": d[1], "detail": d[4]}, "cardiovascular": {"score": d[2], "detail": d[5]}, "metabolism": {"score": d[3], "detail": d[6]}}
     defaults = {"meat": 75, "fish": 90, "dairy": 85, "produce": 100, "pantry": 80, "other": 60}
     s = defaults.get(cat, 70)
     return s, {"microbiome": {"score": 7, "detail": "Standardní produkt"}, "cardiovascular": {"score": 7, "detail": "Neutrální vliv"}, "metabolism": {"score": 7, "detail": "Standardní nutriční profil"}}
 
+def bio_key(name, cat):
+    return f"{cat}:{_first(keyword_hits(name), _BIO_RANKS.get(cat, {})) or '*'}"
+
+def nutrition_key(name):
+    return _first(keyword_hits(name), _NUTRI) or "*"
+
 def get_nutrition(name):
-    nl = name.lower()
-    for kw, n in NUTRI.items():
-        if kw in nl: return {"kcal": n[0], "protein": n[1], "carbs": n[2], "fat": n[3], "fiber": n[4]}
+    kw = _first(keyword_hits(name), _NUTRI)
+    if kw is not None:
+        n = NUTRI[kw]
+        return {"kcal": n[0], "protein": n[1], "carbs": n[2], "fat": n[3], "fiber": n[4]}
     return {"kcal": 0, "protein": 0, "carbs": 0, "fat": 0, "fiber": 0}
 
+# ============================================================
+# HTML PARSING (lxml ak je k dispozícii, text len z relevantných blokov)
+# ============================================================
+
+PARSE_OPTS = {"parser": HTML_PARSER, "scoped": False}
+TEXT_SCOPES = {"kupi": ["price", "offer", "discount", "sleva", "cena"], "search": ["result", "product", "offer", "leaflet"]}
+# texty, ktoré extrakcia hľadá v celej stránke; zúžený text ich nesmie stratiť, inak sa použije celá stránka
+SCOPE_MARKERS = {"kupi": [sn.lower() for sn in STORES.values()] + ["běžně stojí", "nejvýhodněji", "platí do", "kč"], "search": ["kč"]}
+KUPI_ANCHORS = ("běžně stojí", "Nejvýhodněji")
+BS4_SKIPPED_TAGS = ("script", "style", "template", "rt", "rp")
+
+def configure_parser(parser=None, scoped=False):
+    if parser == "lxml" and HTML_PARSER != "lxml": raise ValueError("--parser lxml vyžaduje nainštalovaný balík lxml (pip install lxml)")
+    PARSE_OPTS.update(parser=parser or HTML_PARSER, scoped=scoped)
+
+def _charset(resp):
+    m = re.search(r'charset=["\']?([\w.-]+)', resp.headers.get("Content-Type") or "", re.IGNORECASE)
+    m = m or re.search(rb'<meta[^>]+charset=["\']?([\w.-]+)', resp.content[:4096], re.IGNORECASE)
+    if not m: return "utf-8"
+    cs = m.group(1)
+    return cs.decode("ascii") if isinstance(cs, bytes) else cs
+
+_STORE_NAMES = re.compile("|".join(re.escape(sn) for sn in STORES.values()), re.IGNORECASE)
+
+def _has_store(txt):
+    return _STORE_NAMES.search(txt) is not None
+
+def _scoped_or_full(parts, full, scope):
+    # celý text stránky (full je funkcia) sa skladá len ak zúženému textu chýba niektorý marker
+    txt = "\n".join(parts)
+    tl = txt.lower()
+    if "kč" not in tl: return full()
+    missing = [m for m in SCOPE_MARKERS[scope] if m not in tl]
+    if not missing: return txt
+    page = full()
+    fl = page.lower()
+    return page if any(m in fl for m in missing) else txt
+
+class Bs4Page:
+    def __init__(self, resp, parser, scoped):
+        self.scoped = scoped
+        self.soup = BeautifulSoup(resp.content, parser, from_encoding=_charset(resp))
+        self._texts = {}
+
+    def heading(self):
+        h1 = self.soup.select_one("h1")
+        return h1.get_text(strip=True) if h1 else None
+
+    def _text_of(self, t):
+        # text ako v get_text() celej stránky (bez script/style/template aj vo vnorených prvkoch)
+        if id(t) not in self._texts: self._texts[id(t)] = t.get_text(types=self.soup.interesting_string_types)
+        return self._texts[id(t)]
+
+    def _tops(self, scope):
+        # najvyššie prvky s triedou z TEXT_SCOPES (do ich podstromu sa už nevchádza), v poradí dokumentu
+        stack, tops = [c for c in reversed(self.soup.contents) if c.name], []
+        while stack:
+            t = stack.pop()
+            if any(c in " ".join(t.get("class") or []) for c in TEXT_SCOPES[scope]): tops.append(t)
+            else: stack.extend(c for c in reversed(t.contents) if c.name)
+        return tops
+
+    def _row(self, t, memo):
+        # najbližší predok, ktorý drží obchod spolu s cenou a platnosťou (riadok ponuky);
+        # pri stúpaní sa skladá len text, ktorý pribudol (súrodenci a vlastné reťazce predka), memo drží výsledky podstromov
+        def has(e):
+            if id(e) not in memo: memo[id(e)] = _has_store(self._text_of(e))
+            return memo[id(e)]
+        if has(t): return t
+        while t.parent is not None and t.parent.name != "[document]":
+            p = t.parent
+            if id(p) not in memo: memo[id(p)] = any(c is not t and has(c) for c in p.contents)
+            if memo[id(p)]: return p
+            t = p
+        return t
+
+    def text(self, scope):
+        full = self.soup.get_text
+        if not self.scoped: return full()
+        nodes = self._tops(scope)
+        if scope == "kupi":
+            memo = {}
+            nodes = [self._row(t, memo) for t in nodes] + [s.parent for s in self.soup.strings if any(a in s for a in KUPI_ANCHORS)]
+        ids = {id(t): t for t in nodes}
+        keep = [t for t in ids.values() if not any(id(a) in ids for a in t.parents)]
+        if len(keep) > 1:
+            order = {id(d): i for i, d in enumerate(self.soup.descendants)}
+            keep.sort(key=lambda t: order.get(id(t), -1))
+        return _scoped_or_full([self._text_of(t) for t in keep], full, scope)
+
+class LxmlPage:
+    def __init__(self, resp, scoped):
+        self.scoped = scoped
+        # etree.HTMLParser bez tried lxml.html: prechod prvkami nevolá pythonový lookup pre každý prvok
+        self.doc = lxml.html.document_fromstring(resp.content, parser=etree.HTMLParser(encoding=_charset(resp)))
+        # get_text() v bs4 vynecháva obsah týchto prvkov; bez nich by lxml čítal napr. šablóny ponúk v <template>
+        etree.strip_elements(self.doc, *BS4_SKIPPED_TAGS, with_tail=False)
+        self._texts = {}
+
+    def heading(self):
+        h1 = self.doc.find(".//h1")
+        return "".join(t.strip() for t in h1.itertext()) if h1 is not None else None
+
+    def _tops(self, scope):
+        # najvyššie prvky s triedou z TEXT_SCOPES (do ich podstromu sa už nevchádza), v poradí dokumentu
+        stack, tops = [self.doc], []
+        while stack:
+            n = stack.pop()
+            if not isinstance(n.tag, str): continue
+            if any(c in (n.get("class") or "") for c in TEXT_SCOPES[scope]): tops.append(n)
+            else: stack.extend(reversed(n))
+        return tops
+
+    def _text_of(self, n):
+        if n not in self._texts: self._texts[n] = "".join(n.itertext())
+        return self._texts[n]
+
+    def _row(self, n, memo):
+        # najbližší predok, ktorý drží obchod spolu s cenou a platnosťou (riadok ponuky);
+        # pri stúpaní sa skladá len text, ktorý pribudol (vlastný text predka, súrodenci a chvosty), memo drží výsledky podstromov
+        def has(e):
+            if e not in memo: memo[e] = _has_store(self._text_of(e))
+            return memo[e]
+        if has(n): return n
+        while n.getparent() is not None:
+            p = n.getparent()
+            if p not in memo:
+                memo[p] = _has_store(p.text or "") or any((c is not n and isinstance(c.tag, str) and has(c)) or _has_store(c.tail or "") for c in p)
+            if memo[p]: return p
+            n = p
+        return n
+
+    def text(self, scope):
+        full = lambda: "".join(self.doc.itertext())
+        if not self.scoped: return full()
+        nodes = self._tops(scope)
+        if scope == "kupi":
+            memo = {}
+            nodes = [self._row(n, memo) for n in nodes] + self.doc.xpath("//text()[" + " or ".join(f"contains(., '{a}')" for a in KUPI_ANCHORS) + "]/..")
+        sel = set(nodes)
+        keep = [n for n in self.doc.iter() if n in sel and not any(a in sel for a in n.iterancestors())]
+        return _scoped_or_full([self._text_of(n) for n in keep], full, scope)
+
+def parse_page(resp):
+    if PARSE_OPTS["parser"] == "lxml": return LxmlPage(resp, PARSE_OPTS["scoped"])
+    return Bs4Page(resp, PARSE_OPTS["parser"], PARSE_OPTS["scoped"])
+
+# ============================================================
+# STORE OFFER EXTRACTION (jeden prechod textom)
+# ============================================================
+
+_STORE_BY_LOWER = {sn.lower(): sn for sn in STORES.values()}
+OFFER_EVENTS = re.compile(
+    rf'(?=[{re.escape("".join(sorted({sn[0].lower() for sn in STORES.values()} | set("cp"))))}\d])'
+    rf'(?=(?P<store>{"|".join(re.escape(sn) for sn in STORES.values())})'
+    r'|(?P<cena>cena\s*(?P<cp>\d+[,.]?\d*)\s*Kč)'
+    r'|(?P<unit>(?P<up>\d+[,.]?\d*)\s*Kč\s*/\s*(?P<u>\d+\s*(?:kg|g|ks|l|ml)))'
+    r'|(?P<plati>platí\s+do\s+\w+\s+(?P<pd>\d+)\.\s*(?P<pm>\d+)\.))', re.IGNORECASE)
+
+def _scan_offer_events(text):
+    stores, events = {}, {"cena": ([], []), "unit": ([], []), "plati": ([], [])}
+    for m in OFFER_EVENTS.finditer(text):
+        if m.group("store") is not None:
+            stores.setdefault(_STORE_BY_LOWER[m.group("store").lower()], []).append(m.start())
+            continue
+        kind = "cena" if m.group("cena") is not None else ("unit" if m.group("unit") is not None else "plati")
+        starts, items = events[kind]
+        starts.append(m.start())
+        if kind == "cena": items.append((m.end(kind), m.group("cp"), None))
+        elif kind == "unit": items.append((m.end(kind), m.group("up"), m.group("u").strip()))
+        else: items.append((m.end(kind), m.group("pd"), m.group("pm")))
+    return stores, events
+
+def _store_spans(occ, n, events, first_only=False):
+    # same matches as finditer(rf'{store}.*?{event}', DOTALL) without rescanning the text
+    starts, items = events
+    out, pos = [], 0
+    while True:
+        i = bisect_left(occ, pos)
+        if i == len(occ): break
+        j = bisect_left(starts, occ[i] + n)
+        if j == len(starts): break
+        out.append(items[j])
+        if first_only: break
+        pos = items[j][0]
+    return out
+
+def extract_store_offers(text):
+    stores, events = _scan_offer_events(text)
+    offers, seen = [], set()
+    for sn in STORES.values():
+        occ = stores.get(sn)
+        if not occ: continue
+        vf, vu = get_validity_dates(sn)
+        plat = _store_spans(occ, len(sn), events["plati"], first_only=True)
+        if plat: vu = f"{date.today().year}-{int(plat[0][2]):02d}-{int(plat[0][1]):02d}"
+        for kind in ("cena", "unit"):
+            for _, ps, u in _store_spans(occ, len(sn), events[kind]):
+                p = float(ps.replace(",", "."))
+                if (sn, p) in seen: continue
+                seen.add((sn, p))
+                o = {"store": sn, "sale_price": p}
+                if u is not None: o["unit"] = u
+                o.update(valid_from=vf, valid_until=vu, source="kupi.cz")
+                offers.append(o)
+    return offers
+
 # ============================================================
 # SCRAPERS
 # ============================================================
 
 def scrape_kupi_sleva(slug):
-    url = f"https://www.kupi.cz/sleva/{slug}"
+    url = f"{BASE_URLS['kupi']}/sleva/{slug}"
     result = {"source": "kupi.cz", "slug": slug, "url": url, "name": "", "regular_price": None, "offers": [], "best_price": None, "max_discount": None}
     try:
-        resp = requests.get(url, headers=HEADERS, timeout=15)
+        resp = fetch(url, timeout=15)
         if resp.status_code != 200: return result
-        soup = BeautifulSoup(resp.text, "html.parser")
-        text = soup.get_text()
-        h1 = soup.select_one("h1")
-        if h1: result["name"] = h1.get_text(strip=True)
-        bezna = re.search(r'běžně\s+stojí\s+(\d+[,.]?\d*)\s*Kč', text)
-        if bezna: result["regular_price"] = float(bezna.group(1).replace(",", "."))
-        nejl = re.search(r'Nejvýhodněji.*?(\d+[,.]?\d*)\s*Kč', text)
-        if nejl: result["best_price"] = float(nejl.group(1).replace(",", "."))
-        sleva = re.findall(r'[–-](\d+)\s*%', text)
-        if sleva: result["max_discount"] = max(int(s) for s in sleva)
-        for ss, sn in STORES.items():
-            pat = re.compile(rf'({re.escape(sn)}).*?cena\s*(\d+[,.]?\d*)\s*Kč', re.IGNORECASE | re.DOTALL)
-            for m in pat.finditer(text):
-                p = float(m.group(2).replace(",", "."))
-                if not any(o["store"]==sn and o["sale_price"]==p for o in result["offers"]):
-                    vf, vu = get_validity_dates(sn)
-                    result["offers"].append({"store": sn, "sale_price": p, "valid_from": vf, "valid_until": vu, "source": "kupi.cz"})
-            pat2 = re.compile(rf'({re.escape(sn)}).*?(\d+[,.]?\d*)\s*Kč\s*/\s*(\d+\s*(?:kg|g|ks|l|ml))', re.IGNORECASE | re.DOTALL)
-            for m in pat2.finditer(text):
-                p = float(m.group(2).replace(",", "."))
-                u = m.group(3).strip()
-                if not any(o["store"]==sn and o["sale_price"]==p for o in result["offers"]):
-                    vf, vu = get_validity_dates(sn)
-                    result["offers"].append({"store": sn, "sale_price": p, "unit": u, "valid_from": vf, "valid_until": vu, "source": "kupi.cz"})
-        for o in result["offers"]:
-            plat = re.search(rf'{re.escape(o["store"])}.*?platí\s+do\s+\w+\s+(\d+)\.\s*(\d+)\.', text, re.IGNORECASE | re.DOTALL)
-            if plat:
-                d, mo = int(plat.group(1)), int(plat.group(2))
-                o["valid_until"] = f"{date.today().year}-{mo:02d}-{d:02d}"
+        with METRICS.stage("parse"):
+            page = parse_page(resp)
+            text = page.text("kupi")
+            h1 = page.heading()
+        if h1: result["name"] = h1
+        with METRICS.stage("extract"):
+            bezna = re.search(r'běžně\s+stojí\s+(\d+[,.]?\d*)\s*Kč', text)
+            if bezna: result["regular_price"] = float(bezna.group(1).replace(",", "."))
+            nejl = re.search(r'Nejvýhodněji.*?(\d+[,.]?\d*)\s*Kč', text)
+            if nejl: result["best_price"] = float(nejl.group(1).replace(",", "."))
+            sleva = re.findall(r'[–-](\d+)\s*%', text)
+            if sleva: result["max_discount"] = max(int(s) for s in sleva)
+            result["offers"] = extract_store_offers(text)
         return result
     except Exception as e:
         print(f"  ⚠ kupi.cz [{slug}]: {e}")
         return result
 
+def _extract_offers_legacy(text):
+    # pôvodná extrakcia (regex na každý obchod), ponechaná pre bench_extract.py
+    offers = []
+    for ss, sn in STORES.items():
+        pat = re.compile(rf'({re.escape(sn)}).*?cena\s*(\d+[,.]?\d*)\s*Kč', re.IGNORECASE | re.DOTALL)
+        for m in pat.finditer(text):
+            p = float(m.group(2).replace(",", "."))
+            if not any(o["store"]==sn and o["sale_price"]==p for o in offers):
+                vf, vu = get_validity_dates(sn)
+                offers.append({"store": sn, "sale_price": p, "valid_from": vf, "valid_until": vu, "source": "kupi.cz"})
+        pat2 = re.compile(rf'({re.escape(sn)}).*?(\d+[,.]?\d*)\s*Kč\s*/\s*(\d+\s*(?:kg|g|ks|l|ml))', re.IGNORECASE | re.DOTALL)
+        for m in pat2.finditer(text):
+            p = float(m.group(2).replace(",", "."))
+            u = m.group(3).strip()
+            if not any(o["store"]==sn and o["sale_price"]==p for o in offers):
+                vf, vu = get_validity_dates(sn)
+                offers.append({"store": sn, "sale_price": p, "unit": u, "valid_from": vf, "valid_until": vu, "source": "kupi.cz"})
+    for o in offers:
+        plat = re.search(rf'{re.escape(o["store"])}.*?platí\s+do\s+\w+\s+(\d+)\.\s*(\d+)\.', text, re.IGNORECASE | re.DOTALL)
+        if plat:
+            d, mo = int(plat.group(1)), int(plat.group(2))
+            o["valid_until"] = f"{date.today().year}-{mo:02d}-{d:02d}"
+    return offers
+
 def scrape_iletaky(query):
-    url = f"https://www.iletaky.cz/hledani/?q={requests.utils.quote(query)}"
+    url = f"{BASE_URLS['iletaky']}/hledani/?q={requests.utils.quote(query)}"
     results = []
     try:
-        resp = requests.get(url, headers=HEADERS, timeout=10)
+        resp = fetch(url, timeout=10)
         if resp.status_code != 200: return results
-        text = BeautifulSoup(resp.text, "html.parser").get_text()
-        for ps in re.findall(r'(\d+[,.]?\d*)\s*Kč', text)[:5]:
-            p = float(ps.replace(",", "."))
-            if 1 < p < 1000: results.append({"source": "iletaky.cz", "price": p})
+        with METRICS.stage("parse"): text = parse_page(resp).text("search")
+        with METRICS.stage("extract"):
+            for ps in re.findall(r'(\d+[,.]?\d*)\s*Kč', text)[:5]:
+                p = float(ps.replace(",", "."))
+                if 1 < p < 1000: results.append({"source": "iletaky.cz", "price": p})
         return results
     except: return results
 
 def scrape_akcniceny(query):
-    url = f"https://www.akcniceny.cz/hledani/?q={requests.utils.quote(query)}"
+    url = f"{BASE_URLS['akcniceny']}/hledani/?q={requests.utils.quote(query)}"
     results = []
     try:
-        resp = requests.get(url, headers=HEADERS, timeout=10)
+        resp = fetch(url, timeout=10)
         if resp.status_code != 200: return results
-        text = BeautifulSoup(resp.text, "html.parser").get_text()
-        for ps in re.findall(r'(\d+[,.]?\d*)\s*Kč', text)[:5]:
-            p = float(ps.replace(",", "."))
-            if 1 < p < 1000: results.append({"source": "akcniceny.cz", "price": p})
+        with METRICS.stage("parse"): text = parse_page(resp).text("search")
+        with METRICS.stage("extract"):
+            for ps in re.findall(r'(\d+[,.]?\d*)\s*Kč', text)[:5]:
+                p = float(ps.replace(",", "."))
+                if 1 < p < 1000: results.append({"source": "akcniceny.cz", "price": p})
         return results
     except: return results
 
-def cross_verify(name, kupi_price):
+# ============================================================
+# CROSS-VERIFICATION (deduplikované dotazy + cache na letákový týždeň)
+# ============================================================
+
+QUERY_STOPWORDS = {"filety","filet","filé","obecný","obecné","čerstvý","čerstvá","čerstvé","chlazený","chlazená","chlazené","mražený","mražená","mražené","polotučný","tučný","nízkotučný","plnotučný","jemný","bio","kvalitní","balený","balení","cca","vybrané","druhy"}
+_verify_memo = {}
+_verify_lock = threading.Lock()
+
+def normalize_query(name):
+    nl = re.sub(r'\d+(?:[,.]\d+)?\s*(?:(?:kg|g|ks|l|ml)(?!\w)|%)?', " ", name.lower())
+    toks = [t for t in re.findall(r'\w+', nl) if t not in QUERY_STOPWORDS and not t.isdigit()]
+    return " ".join(toks) or name.lower().strip()
+
+def _verify_cache_file():
+    return os.path.join(_cache.path, "verify_cache.json") if _cache else None
+
+def _load_verify_cache():
+    fp = _verify_cache_file()
+    if not fp or not os.path.exists(fp): return {}
+    try:
+        with open(fp, encoding="utf-8") as f: data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data.get("queries", {}) if data.get("expires_at", "") > datetime.now().isoformat() else {}
+
+def _save_verify_cache(queries):
+    fp = _verify_cache_file()
+    if not fp or _cache.offline: return
+    tmp = fp + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f: json.dump({"expires_at": next_flyer_change().isoformat(), "queries": queries}, f, ensure_ascii=False)
+    os.replace(tmp, fp)
+
+class SourceLookup:
+    # každý normalizovaný dotaz sa na iLetaky/AkcniCeny pošle raz, hneď ako je známy; výsledok sa čaká až pri použití
+    def __init__(self, pool):
+        self.pool, self.futs, self.fetched = pool, {}, 0
+        with _verify_lock:
+            if not _verify_memo: _verify_memo.update(_load_verify_cache())
+
+    def submit(self, q):
+        with _verify_lock:
+            if q in _verify_memo or q in self.futs: return
+        self.futs[q] = (self.pool.submit(scrape_iletaky, q), self.pool.submit(scrape_akcniceny, q))
+        self.fetched += 1
+
+    def result(self, q):
+        with _verify_lock:
+            if q in _verify_memo: return _verify_memo[q]
+        il, ac = self.futs.pop(q)
+        found = il.result() + ac.result()
+        with _verify_lock: _verify_memo[q] = found
+        return found
+
+    def save(self):
+        if not self.fetched: return
+        with _verify_lock: _save_verify_cache({q: r for q, r in _verify_memo.items() if r})
+
+def lookup_sources(queries, max_workers=None):
+    with ThreadPoolExecutor(max_workers=max_workers or _verify_pool_size() * 2) as vp:
+        lookup = SourceLookup(vp)
+        for q in queries: lookup.submit(q)
+        found = {q: lookup.result(q) for q in queries}
+    lookup.save()
+    return found
+
+def build_verification(kupi_price, sources):
     v = {"kupi_price": kupi_price, "other_sources": [], "verified": False, "confidence": "low"}
-    il = scrape_iletaky(name)
-    for i in il:
-        v["other_sources"].append(i)
-        if abs(i["price"] - kupi_price) < 2.0: v["verified"] = True
-    time.sleep(0.3)
-    ac = scrape_akcniceny(name)
-    for i in ac:
+    for i in sources:
         v["other_sources"].append(i)
         if abs(i["price"] - kupi_price) < 2.0: v["verified"] = True
     v["confidence"] = "high" if v["verified"] else ("medium" if v["other_sources"] else "low")
     return v
 
+def verify_batch(items):
+    keys = [normalize_query(name) for name, _ in items]
+    found = lookup_sources(keys)
+    return [build_verification(price, found[k]) for (_, price), k in zip(items, keys)]
+
+def cross_verify(name, kupi_price):
+    return verify_batch([(name, kupi_price)])[0]
+
 # ============================================================
 # PRODUCT SLUGS
 # ============================================================
@@ -168,11 +777,257 @@ SLUGS = {
     "pantry": ["olivovy-olej-bertolli","olivovy-olej-extra-virgin","ryze-basmati","ovesne-vlocky","ovesne-vlocky-emco","cocka-cervena","mandle","vlaske-orechy","testoviny-barilla","fazole-bile","med"],
 }
 
+def _kupi_pool_size():
+    return host_limit("www.kupi.cz")["concurrency"]
+
+def _verify_pool_size():
+    return max(host_limit("www.iletaky.cz")["concurrency"], host_limit("www.akcniceny.cz")["concurrency"])
+
+def _pipeline_window():
+    return _kupi_pool_size() * 4
+
+# ============================================================
+# INCREMENTAL (znovupoužitie platných ponúk + delta)
+# ============================================================
+
+VOLATILE_FIELDS = ("scraped_at",)
+
+def load_json(fp):
+    try:
+        with open(fp, encoding="utf-8") as f: return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _expand_row(p, lk):
+    if "bio_ref" in p: p["bio_audit"] = lk["bio"].get(p.pop("bio_ref"))
+    if "nutrition_ref" in p: p["nutrition"] = lk["nutrition"].get(p.pop("nutrition_ref"))
+    return p
+
+def expand_lookups(data):
+    lk = data.pop("lookups", None) if data else None
+    if lk:
+        for p in data.get("products", []): _expand_row(p, lk)
+    return data
+
+def read_jsonl(fp):
+    # products.jsonl: riadok {"lookup": ...} so šablónou je vždy pred prvým produktom, ktorý sa na ňu odkazuje
+    lk = {"bio": {}, "nutrition": {}}
+    with open(fp, encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            if "lookup" in row: lk[row["lookup"]][row["key"]] = row["value"]
+            else: yield _expand_row(row, lk)
+
+def load_previous(output_dir):
+    return expand_lookups(load_json(os.path.join(output_dir, "products.json")))
+
+def is_fresh(p, today=None):
+    today = (today or date.today()).isoformat()
+    offers = p.get("offers") or []
+    return bool(offers) and all(o.get("valid_from", "") <= today <= o.get("valid_until", "") for o in offers)
+
+def _stable(p):
+    return {k: v for k, v in p.items() if k not in VOLATILE_FIELDS}
+
+# ============================================================
+# OUTPUT WRITER (JSON Lines + kompaktný JSON, priebežný súhrn)
+# ============================================================
+
+SOURCES = ["kupi.cz", "iletaky.cz", "akcniceny.cz"]
+
+def run_meta():
+    return {"generated_at": datetime.now().isoformat(), "flyer_week": f"{date.today().strftime('%d.%m')} – {(date.today()+timedelta(days=6)).strftime('%d.%m.%Y')}", "store_location": "Příbram", "sources": SOURCES}
+
+class RunSummary:
+    def __init__(self):
+        self.cats, self.total, self.with_offers, self.verified = {}, 0, 0, 0
+
+    def add(self, p):
+        c = self.cats.setdefault(p["category"], {"count": 0, "min_price": None, "discount_sum": 0})
+        c["count"] += 1
+        if p.get("best_price") and (c["min_price"] is None or p["best_price"] < c["min_price"]): c["min_price"] = p["best_price"]
+        c["discount_sum"] += p.get("max_discount") or 0
+        self.total += 1
+        if p.get("offers") or p.get("best_price"): self.with_offers += 1
+        if (p.get("verification") or {}).get("verified"): self.verified += 1
+
+    def to_dict(self):
+        return {"generated_at": datetime.now().isoformat(), "store_location": "Příbram", "sources": SOURCES, "categories": {k: {"count": c["count"], "min_price": c["min_price"], "avg_discount": round(c["discount_sum"]/max(c["count"],1), 1)} for k, c in self.cats.items()}, "total_clean_products": self.total, "total_with_offers": self.with_offers, "total_verified": self.verified}
+
+def _file_digest(fp):
+    try:
+        with open(fp, encoding="utf-8") as f: m = re.search(r'"digest":"(\w+)"', f.read(512))
+    except OSError:
+        return None
+    return m and m.group(1)
+
+class StreamWriter:
+    # produkty idú na disk hneď pri write(); v pamäti ostáva len lookups, súhrn a rozpracované kategórie (dočasné súbory)
+    def __init__(self, output_dir, previous=None, history=True):
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir, self.history = output_dir, history
+        self.meta = run_meta()
+        self.jsonl_path = self._path("products.jsonl")
+        self.f = open(self.jsonl_path + ".tmp", "w", encoding="utf-8")
+        self.lookups = {"bio": {}, "nutrition": {}}
+        self.cats = {}
+        self.summary = RunSummary()
+        self.previous = None if previous is None else {p["slug"]: p for p in previous.get("products", [])}
+        self.previous_generated_at = (previous or {}).get("generated_at")
+        self.changes = None if previous is None else open(self._path("changes.jsonl.tmp"), "w", encoding="utf-8")
+        self.counts = {"added": 0, "updated": 0, "unchanged": 0}
+        self.changed_refs = {"bio": set(), "nutrition": set()}
+        self.changed_cats = []
+
+    def _path(self, name):
+        return os.path.join(self.output_dir, name)
+
+    def write(self, p):
+        with METRICS.stage("serialize"): self._write(p)
+
+    def _write(self, p):
+        bk, nk = bio_key(p["name"], p["category"]), nutrition_key(p["name"])
+        for kind, key, value in (("bio", bk, p["bio_audit"]), ("nutrition", nk, p["nutrition"])):
+            if key in self.lookups[kind]: continue
+            self.lookups[kind][key] = value
+            self.f.write(json.dumps({"lookup": kind, "key": key, "value": value}, ensure_ascii=False, separators=(",", ":")) + "\n")
+        row = {}
+        for k, v in p.items():
+            if k == "bio_audit": row["bio_ref"] = bk
+            elif k == "nutrition": row["nutrition_ref"] = nk
+            else: row[k] = v
+        line = json.dumps(row, ensure_ascii=False, separators=(",", ":"))
+        self.f.write(line + "\n")
+        c = self.cats.get(p["category"])
+        if c is None:
+            c = self.cats[p["category"]] = {"f": open(self._path(f"products_{p['category']}.jsonl.tmp"), "w", encoding="utf-8"), "bio": set(), "nutrition": set(), "sha": hashlib.sha1(), "count": 0}
+        c["f"].write(line + "\n")
+        c["bio"].add(bk)
+        c["nutrition"].add(nk)
+        c["sha"].update(json.dumps(_stable(row), ensure_ascii=False, sort_keys=True).encode("utf-8"))
+        c["count"] += 1
+        if self.previous is not None:
+            old = self.previous.pop(p["slug"], None)
+            kind = "added" if old is None else ("updated" if _stable(old) != _stable(p) else "unchanged")
+            self.counts[kind] += 1
+            if kind != "unchanged":
+                self.changes.write(f"{kind}\t{line}\n")
+                self.changed_refs["bio"].add(bk)
+                self.changed_refs["nutrition"].add(nk)
+        self.summary.add(p)
+
+    def close(self):
+        with METRICS.stage("serialize"): self._close()
+        if self.history and not (_cache and _cache.offline):
+            with METRICS.stage("history"): self._record_history()
+
+    def _dump(self, fp, head, parts):
+        # head + polia riadkov z JSON Lines súborov, bez načítania celého zoznamu do pamäte
+        with open(fp + ".tmp", "w", encoding="utf-8") as out:
+            out.write(json.dumps(head, ensure_ascii=False, separators=(",", ":"))[:-1])
+            for key, src, keep in parts:
+                out.write(f',"{key}":[')
+                with open(src, encoding="utf-8") as f:
+                    first = True
+                    for line in f:
+                        if line.startswith('{"lookup":'): continue
+                        if keep:
+                            kind, _, line = line.partition("\t")
+                            if kind != keep: continue
+                        out.write(("" if first else ",") + line.rstrip("\n"))
+                        first = False
+                out.write("]")
+            out.write("}")
+        os.replace(fp + ".tmp", fp)
+
+    def _close(self):
+        self.f.close()
+        os.replace(self.jsonl_path + ".tmp", self.jsonl_path)
+        fp = self._path("products.json")
+        self._dump(fp, dict(self.meta, total_products=self.summary.total, lookups=self.lookups), [("products", self.jsonl_path, None)])
+        print(f"\n💾 {fp} + {self.jsonl_path} ({self.summary.total}, {len(self.lookups['bio'])} bio / {len(self.lookups['nutrition'])} nutri šablón)")
+
+        for cat, c in self.cats.items():
+            c["f"].close()
+            cp, tmp = self._path(f"products_{cat}.json"), self._path(f"products_{cat}.jsonl.tmp")
+            digest = c["sha"].hexdigest()
+            if self.previous is not None and _file_digest(cp) == digest:
+                os.remove(tmp)
+                print(f"⏸ {cp} — bez zmeny")
+                continue
+            head = {"generated_at": self.meta["generated_at"], "category": cat, "digest": digest, "total_products": c["count"],
+                    "lookups": {k: {r: self.lookups[k][r] for r in sorted(c[k])} for k in ("bio", "nutrition")}}
+            self._dump(cp, head, [("products", tmp, None)])
+            os.remove(tmp)
+            self.changed_cats.append(cat)
+            print(f"💾 {cp} ({c['count']})")
+        # kategória, ktorá v tomto behu nemá produkty, nesmie ostať so starým súborom
+        for cat in [*CATEGORY_KEYWORDS, "other"]:
+            cp = self._path(f"products_{cat}.json")
+            if cat in self.cats or not os.path.exists(cp): continue
+            os.remove(cp)
+            self.changed_cats.append(cat)
+            print(f"🗑 {cp} — bez produktov")
+
+        sp = self._path("summary.json")
+        with open(sp, "w", encoding="utf-8") as f: json.dump(self.summary.to_dict(), f, ensure_ascii=False, indent=2)
+        print(f"💾 {sp}")
+
+        if self.changes is not None:
+            self.changes.close()
+            chp, tmp = self._path("changes.json"), self._path("changes.jsonl.tmp")
+            # lookups len pre kľúče, na ktoré sa odkazujú added/updated riadky
+            lookups = {k: {r: self.lookups[k][r] for r in sorted(self.changed_refs[k])} for k in ("bio", "nutrition")}
+            head = {"generated_at": self.meta["generated_at"], "previous_generated_at": self.previous_generated_at, "lookups": lookups,
+                    "removed": list(self.previous), "unchanged": self.counts["unchanged"], "changed_categories": sorted(self.changed_cats)}
+            self._dump(chp, head, [("added", tmp, "added"), ("updated", tmp, "updated")])
+            os.remove(tmp)
+            print(f"💾 {chp} (+{self.counts['added']} ~{self.counts['updated']} -{len(self.previous)})")
+
+    def _record_history(self):
+        try:
+            from .price_history import DB_NAME, record_run
+        except ImportError:
+            from price_history import DB_NAME, record_run
+        hp = self._path(DB_NAME)
+        run_id = record_run(hp, read_jsonl(self.jsonl_path), generated_at=self.meta["generated_at"], flyer_week=self.meta["flyer_week"])
+        print(f"💾 {hp} (beh #{run_id})")
+
 # ============================================================
 # MAIN
 # ============================================================
 
-def run_full_scrape():
+def _scraped(jobs, reuse, window):
+    # kupi.cz stránky v poradí SLUGS, rozbehnutých najviac `window` naraz
+    with ThreadPoolExecutor(max_workers=_kupi_pool_size()) as kp:
+        todo, queue = iter(jobs), deque()
+        def submit():
+            for cat, slug in todo:
+                queue.append((cat, slug, None if slug in reuse else kp.submit(scrape_kupi_sleva, slug)))
+                return
+        for _ in range(window): submit()
+        while queue:
+            cat, slug, fut = queue.popleft()
+            submit()
+            with METRICS.wait("kupi"): data = fut and fut.result()
+            yield cat, slug, data
+
+def _with_verification(items, lookup, window):
+    # dotaz na overenie sa pošle hneď po kupi.cz stránke, na výsledok sa čaká až o `window` produktov neskôr
+    pending = deque()
+    def done():
+        cat, slug, data, q = pending.popleft()
+        if q is None: return cat, slug, data, None
+        with METRICS.wait("verify"): found = lookup.result(q)
+        return cat, slug, data, build_verification(data["best_price"], found)
+    for cat, slug, data in items:
+        q = normalize_query(data["name"]) if data and data["name"] and data.get("best_price") and is_clean(data["name"]) else None
+        if q is not None: lookup.submit(q)
+        pending.append((cat, slug, data, q))
+        if len(pending) > window: yield done()
+    while pending: yield done()
+
+def run_full_scrape(previous=None, writer=None):
     print("=" * 60)
     print("🔬 CLEAN EATING AGENT — Multi-Source Scraper v2")
     print(f"📅 {datetime.now().strftime('%d.%m.%Y %H:%M')}")
@@ -180,80 +1035,121 @@ def run_full_scrape():
     print("=" * 60)
     
     products = []
-    stats = {"total": 0, "clean": 0, "priority": 0, "with_price": 0, "verified": 0}
+    stats = {"total": 0, "clean": 0, "priority": 0, "with_price": 0, "verified": 0, "to_verify": 0}
+    jobs = [(cat, slug) for cat, slugs in SLUGS.items() for slug in slugs]
+    reuse = {p["slug"]: p for p in (previous or {}).get("products", []) if is_fresh(p)}
+    
+    emit = writer.write if writer else products.append
+    window = _pipeline_window()
     
-    for cat, slugs in SLUGS.items():
-        print(f"\n📦 {cat.upper()}")
-        print("-" * 40)
-        for slug in slugs:
-            time.sleep(0.5)
+    with ThreadPoolExecutor(max_workers=_verify_pool_size() * 2) as vp:
+        lookup = SourceLookup(vp)
+        last_cat = None
+        for cat, slug, data, ver in _with_verification(_scraped(jobs, reuse, window), lookup, window):
+            if cat != last_cat:
+                print(f"\n📦 {cat.upper()}")
+                print("-" * 40)
+                last_cat = cat
             stats["total"] += 1
-            data = scrape_kupi_sleva(slug)
+            if data is None:
+                p = reuse[slug]
+                stats["clean"] += 1
+                if p.get("is_priority"): stats["priority"] += 1
+                stats["with_price"] += 1
+                if (p.get("verification") or {}).get("verified"): stats["verified"] += 1
+                emit(p)
+                print(f"  ♻ {p['name']} — platné do {min(o['valid_until'] for o in p['offers'])}")
+                continue
             if not data["name"]:
                 print(f"  ⏭ {slug} — nenájdené")
                 continue
-            if not is_clean(data["name"]):
+            with METRICS.stage("classify"):
+                clean = is_clean(data["name"])
+                if clean:
+                    c = get_clean_category(data["name"])
+                    pri = is_priority(data["name"])
+                    score, bio = get_bio_audit(data["name"], c)
+                    nutri = get_nutrition(data["name"])
+            if not clean:
                 print(f"  🚫 {data['name']} — UPF")
                 continue
             stats["clean"] += 1
-            c = get_clean_category(data["name"])
-            pri = is_priority(data["name"])
             if pri: stats["priority"] += 1
             if data.get("offers") or data.get("best_price"): stats["with_price"] += 1
-            
-            ver = None
-            if data.get("best_price"):
-                time.sleep(0.3)
-                ver = cross_verify(data["name"], data["best_price"])
-                if ver["verified"]: stats["verified"] += 1
-            
-            score, bio = get_bio_audit(data["name"], c)
-            nutri = get_nutrition(data["name"])
-            
+        
+            if ver: stats["to_verify"] += 1
+            if ver and ver["verified"]: stats["verified"] += 1
+        
             p = {
                 "name": data["name"], "slug": slug, "category": c, "is_priority": pri,
                 "regular_price": data.get("regular_price"), "best_price": data.get("best_price"),
                 "max_discount": data.get("max_discount"), "offers": data.get("offers", []),
                 "clean_score": score, "bio_audit": bio, "nutrition": nutri,
                 "source_url": data["url"],
-                "sources_checked": list(set(["kupi.cz"] + [s["source"] for s in (ver or {}).get("other_sources", [])])),
+                "sources_checked": ["kupi.cz"] + sorted({s["source"] for s in (ver or {}).get("other_sources", [])} - {"kupi.cz"}),
                 "verification": ver, "scraped_at": datetime.now().isoformat(),
             }
-            products.append(p)
-            
+            emit(p)
+        
             ps = f" → {data['best_price']} Kč" if data.get("best_price") else (f" → od {min(o['sale_price'] for o in data['offers'])} Kč" if data.get("offers") else "")
             ds = f" (-{data['max_discount']}%)" if data.get("max_discount") else ""
             vs = " ✓" if ver and ver.get("verified") else ""
             print(f"  ✅ {data['name']}{ps}{ds}{' ⭐' if pri else ''}{vs}")
     
+    lookup.save()
+    print(f"🔎 Cross-verifikácia: {stats['to_verify']} produktov → {lookup.fetched} nových dotazov")
+    if previous is not None: print(f"\n♻ Znovupoužitých (platné ponuky): {len(reuse)}")
+    m = METRICS.to_dict()
+    print("⏱ " + " · ".join(f"{k} {v['seconds']:.2f}s" for k, v in m["stages"].items()) + f" · {sum(h['bytes'] for h in m['hosts'].values()) / 1024:.0f} kB"
+          + " · čakanie " + " · ".join(f"{k} {v['seconds']:.2f}s" for k, v in m["waits"].items()))
     print(f"\n{'='*60}\n📊 VÝSLEDKY\n  Spracovaných: {stats['total']}\n  Clean: {stats['clean']}\n  Prioritných: {stats['priority']}\n  S cenou: {stats['with_price']}\n  Cross-overených: {stats['verified']}\n{'='*60}")
-    return products
-
-def save_results(products, output_dir="."):
-    os.makedirs(output_dir, exist_ok=True)
-    fp = os.path.join(output_dir, "products.json")
-    out = {"generated_at": datetime.now().isoformat(), "flyer_week": f"{date.today().strftime('%d.%m')} – {(date.today()+timedelta(days=6)).strftime('%d.%m.%Y')}", "store_location": "Příbram", "sources": ["kupi.cz","iletaky.cz","akcniceny.cz"], "total_products": len(products), "products": products}
-    with open(fp, "w", encoding="utf-8") as f: json.dump(out, f, ensure_ascii=False, indent=2)
-    print(f"\n💾 {fp}")
-    
-    cats = {}
-    for p in products:
-        cats.setdefault(p["category"], []).append(p)
-    for c, items in cats.items():
-        cp = os.path.join(output_dir, f"products_{c}.json")
-        with open(cp, "w", encoding="utf-8") as f: json.dump({"generated_at": datetime.now().isoformat(), "category": c, "total_products": len(items), "products": items}, f, ensure_ascii=False, indent=2)
-        print(f"💾 {cp} ({len(items)})")
-    
-    sp = os.path.join(output_dir, "summary.json")
-    summary = {"generated_at": datetime.now().isoformat(), "store_location": "Příbram", "sources": ["kupi.cz","iletaky.cz","akcniceny.cz"], "categories": {c: {"count": len(i), "min_price": min((p["best_price"] for p in i if p.get("best_price")), default=None), "avg_discount": round(sum(p.get("max_discount") or 0 for p in i)/max(len(i),1), 1)} for c, i in cats.items()}, "total_clean_products": len(products), "total_with_offers": sum(1 for p in products if p.get("offers") or p.get("best_price")), "total_verified": sum(1 for p in products if p.get("verification", {}).get("verified"))}
-    with open(sp, "w", encoding="utf-8") as f: json.dump(summary, f, ensure_ascii=False, indent=2)
-    print(f"💾 {sp}")
+    return None if writer else products
+
+def save_metrics(output_dir):
+    mp = os.path.join(output_dir, "metrics.json")
+    with open(mp, "w", encoding="utf-8") as f: json.dump(METRICS.to_dict(), f, ensure_ascii=False, indent=2)
+    print(f"💾 {mp}")
+
+def save_results(products, output_dir=".", previous=None, history=True):
+    writer = StreamWriter(output_dir, previous=previous, history=history)
+    for p in products: writer.write(p)
+    writer.close()
+    save_metrics(output_dir)
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("--output", default="data")
+    parser.add_argument("--cache-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".http_cache"))
+    parser.add_argument("--no-cache", action="store_true", help="vždy sťahovať celé stránky")
+    parser.add_argument("--offline", action="store_true", help="len z cache, bez siete")
+    parser.add_argument("--host-limit", action="append", default=[], metavar="HOST=RPS:CONC", help="napr. www.kupi.cz=4:3 (predvolené www.kupi.cz=2:2)")
+    parser.add_argument("--parser", choices=["auto", "lxml", "html.parser"], default="auto", help="HTML parser (auto = lxml ak je nainštalovaný)")
+    parser.add_argument("--legacy-parse", action="store_true", help="pôvodné parsovanie: html.parser, text celej stránky")
+    parser.add_argument("--scoped-text", action="store_true", help="extrahovať len z riadkov ponúk/výsledkov (pri strate obchodu, ceny či platnosti celá stránka)")
+    parser.add_argument("--incremental", action="store_true", help="znovupoužiť platné ponuky z predošlého products.json, zapísať changes.json")
+    parser.add_argument("--no-history", action="store_true", help="nezapisovať do SQLite histórie cien")
+    parser.add_argument("--classify", metavar="FILE", help="klasifikovať názvy (1 na riadok, - = stdin) do JSON Lines a skončiť")
     args = parser.parse_args()
-    products = run_full_scrape()
-    save_results(products, output_dir=args.output)
+    if args.classify:
+        import sys
+        with (sys.stdin if args.classify == "-" else open(args.classify, encoding="utf-8")) as f:
+            for r in classify_many(line.strip() for line in f if line.strip()):
+                print(json.dumps(r, ensure_ascii=False))
+        sys.exit(0)
+    try:
+        for host, rps, conc in [parse_host_limit(hl) for hl in args.host_limit]: set_host_limit(host, rps, conc)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        if args.legacy_parse: configure_parser("html.parser", scoped=False)
+        else: configure_parser(None if args.parser == "auto" else args.parser, scoped=args.scoped_text)
+    except ValueError as e:
+        parser.error(str(e))
+    configure_cache(None if args.no_cache and not args.offline else args.cache_dir, offline=args.offline)
+    previous = (load_previous(args.output) or {"products": []}) if args.incremental else None
+    writer = StreamWriter(args.output, previous=previous, history=not args.no_history)
+    run_full_scrape(previous, writer=writer)
+    writer.close()
+    save_metrics(args.output)
     print("\n✅ Hotovo!")
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Clean Eating Agent — SQLite história cien
+Každý beh save_results zapíše produkty, ponuky a cross-verifikáciu; dotazy na trend, minimum a zľavy obchodov.
+
+    python scraper/price_history.py trend kureci-prsa
+    python scraper/price_history.py lowest kureci-prsa --weeks 8
+    python scraper/price_history.py discounts --weeks 12
+"""
+
+import json
+import os
+import sqlite3
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+DB_NAME = "price_history.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, generated_at TEXT NOT NULL, flyer_week TEXT);
+CREATE TABLE IF NOT EXISTS products (slug TEXT PRIMARY KEY, name TEXT, category TEXT, is_priority INTEGER, first_seen TEXT, last_seen TEXT);
+CREATE TABLE IF NOT EXISTS snapshots (run_id INTEGER NOT NULL REFERENCES runs(id), slug TEXT NOT NULL, regular_price REAL, best_price REAL, max_discount INTEGER, PRIMARY KEY (slug, run_id));
+CREATE TABLE IF NOT EXISTS offers (id INTEGER PRIMARY KEY, run_id INTEGER NOT NULL REFERENCES runs(id), slug TEXT NOT NULL, store TEXT NOT NULL, sale_price REAL NOT NULL, regular_price REAL, unit TEXT, valid_from TEXT NOT NULL, valid_until TEXT, source TEXT, UNIQUE (slug, store, sale_price, valid_from));
+CREATE TABLE IF NOT EXISTS verification (run_id INTEGER NOT NULL REFERENCES runs(id), slug TEXT NOT NULL, kupi_price REAL, verified INTEGER, confidence TEXT, other_sources TEXT, PRIMARY KEY (slug, run_id));
+CREATE INDEX IF NOT EXISTS ix_offers_slug_from ON offers (slug, valid_from);
+CREATE INDEX IF NOT EXISTS ix_offers_store_from ON offers (store, valid_from);
+CREATE INDEX IF NOT EXISTS ix_offers_until ON offers (valid_until);
+"""
+
+def connect(path, readonly=False):
+    if readonly:
+        if not os.path.isfile(path): raise FileNotFoundError(f"databáza {path} neexistuje")
+        return sqlite3.connect(Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+def record_run(path, products, generated_at=None, flyer_week=None):
+    # products môže byť aj generátor (napr. read_jsonl nad products.jsonl), prechádza sa raz
+    generated_at = generated_at or datetime.now().isoformat()
+    conn = connect(path)
+    try:
+        with conn:
+            run_id = conn.execute("INSERT INTO runs (generated_at, flyer_week) VALUES (?, ?)", (generated_at, flyer_week)).lastrowid
+            for p in products:
+                conn.execute(
+                    "INSERT INTO products (slug, name, category, is_priority, first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(slug) DO UPDATE SET name=excluded.name, category=excluded.category, is_priority=excluded.is_priority, last_seen=excluded.last_seen",
+                    (p["slug"], p["name"], p["category"], int(bool(p.get("is_priority"))), generated_at, generated_at))
+                conn.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?)", (run_id, p["slug"], p.get("regular_price"), p.get("best_price"), p.get("max_discount")))
+                conn.executemany(
+                    "INSERT OR IGNORE INTO offers (run_id, slug, store, sale_price, regular_price, unit, valid_from, valid_until, source) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(run_id, p["slug"], o["store"], o["sale_price"], p.get("regular_price"), o.get("unit"), o.get("valid_from") or generated_at[:10], o.get("valid_until"), o.get("source"))
+                     for o in p.get("offers") or []])
+                v = p.get("verification")
+                if v:
+                    conn.execute("INSERT OR REPLACE INTO verification VALUES (?, ?, ?, ?, ?, ?)",
+                        (run_id, p["slug"], v.get("kupi_price"), int(bool(v.get("verified"))), v.get("confidence"), json.dumps(v.get("other_sources", []), ensure_ascii=False)))
+        return run_id
+    finally:
+        conn.close()
+
+def _since(weeks):
+    return (date.today() - timedelta(weeks=weeks)).isoformat() if weeks else ""
+
+def price_trend(conn, slug, weeks=None):
+    rows = conn.execute(
+        "SELECT valid_from, MIN(sale_price), COUNT(*) FROM offers WHERE slug = ? AND valid_from >= ? GROUP BY valid_from ORDER BY valid_from",
+        (slug, _since(weeks))).fetchall()
+    return [{"valid_from": vf, "min_price": p, "offers": n} for vf, p, n in rows]
+
+def lowest_price(conn, slug, weeks=8):
+    row = conn.execute(
+        "SELECT sale_price, store, valid_from FROM offers WHERE slug = ? AND valid_from >= ? ORDER BY sale_price LIMIT 1",
+        (slug, _since(weeks))).fetchone()
+    return {"slug": slug, "weeks": weeks, "price": row[0], "store": row[1], "valid_from": row[2]} if row else None
+
+def is_deal(conn, slug, price, weeks=8):
+    low = lowest_price(conn, slug, weeks)
+    return low is None or price <= low["price"]
+
+def store_avg_discount(conn, weeks=None):
+    rows = conn.execute(
+        "SELECT store, AVG((regular_price - sale_price) * 100.0 / regular_price), COUNT(*) FROM offers "
+        "WHERE regular_price > 0 AND valid_from >= ? GROUP BY store ORDER BY 2 DESC",
+        (_since(weeks),)).fetchall()
+    return [{"store": s, "avg_discount": round(d, 1), "offers": n} for s, d, n in rows]
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default=os.path.join("data", DB_NAME))
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    t = sub.add_parser("trend", help="najnižšia cena po letákových týždňoch")
+    t.add_argument("slug")
+    t.add_argument("--weeks", type=int)
+    l = sub.add_parser("lowest", help="najnižšia cena za posledných N týždňov")
+    l.add_argument("slug")
+    l.add_argument("--weeks", type=int, default=8)
+    d = sub.add_parser("discounts", help="priemerná zľava podľa obchodu")
+    d.add_argument("--weeks", type=int)
+    args = parser.parse_args()
+    try:
+        conn = connect(args.db, readonly=True)
+    except (OSError, sqlite3.Error) as e:
+        parser.exit(1, f"⚠ {e}\n")
+    if args.cmd == "trend": out = price_trend(conn, args.slug, args.weeks)
+    elif args.cmd == "lowest": out = lowest_price(conn, args.slug, args.weeks)
+    else: out = store_avg_discount(conn, args.weeks)
+    print(json.dumps(out, ensure_ascii=False, indent=2))
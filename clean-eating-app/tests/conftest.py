@@ -0,0 +1,32 @@
+import pytest
+
+import kupi_scraper as ks
+from fixture_pages import FIXTURES_DIR, kupi_pages, load_pages, point_scraper_at, search_queries, serve
+
+@pytest.fixture(scope="session")
+def pages():
+    return load_pages(FIXTURES_DIR)
+
+@pytest.fixture(scope="session")
+def slugs(pages):
+    return sorted(kupi_pages(pages))
+
+@pytest.fixture(scope="session")
+def queries(pages):
+    return search_queries(pages)
+
+@pytest.fixture(scope="session")
+def server(pages):
+    srv = serve(pages)
+    saved = point_scraper_at(srv)
+    yield srv
+    srv.shutdown()
+    ks.BASE_URLS.update(saved)
+
+@pytest.fixture
+def site(server):
+    # každý test musí trafiť len stránky z fixtures; 404 znamená nesúlad fixtures a URL scrapera
+    server.misses.clear()
+    ks._verify_memo.clear()
+    yield server
+    assert server.misses == []
@@ -0,0 +1,69 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from bs4 import BeautifulSoup
+
+import kupi_scraper as ks
+from bench_scraper import build_product
+from fixture_pages import kupi_pages, synthetic_pages
+
+@pytest.fixture(autouse=True)
+def full_page_text():
+    yield
+    ks.configure_parser()
+
+def test_fixture_pages_resolve(site, slugs, queries):
+    assert slugs and queries
+    for d in (ks.scrape_kupi_sleva(s) for s in slugs):
+        assert d["name"], d["slug"]
+        assert d["offers"] and d["best_price"] and d["regular_price"], d["slug"]
+    for q in queries:
+        assert ks.scrape_iletaky(q) and ks.scrape_akcniceny(q), q
+
+def test_offer_extraction_matches_legacy(pages):
+    for slug, body in kupi_pages(pages).items():
+        text = BeautifulSoup(body, "html.parser").get_text()
+        assert ks.extract_store_offers(text) == ks._extract_offers_legacy(text), slug
+
+def test_offer_extraction_matches_legacy_on_large_pages():
+    for name, body in synthetic_pages().items():
+        text = BeautifulSoup(body, "html.parser").get_text()
+        assert ks.extract_store_offers(text) == ks._extract_offers_legacy(text), name
+
+@pytest.mark.parametrize("name", sorted(synthetic_pages()))
+def test_bench_extract_store_offers(benchmark, name):
+    text = BeautifulSoup(synthetic_pages()[name], "html.parser").get_text()
+    assert benchmark(ks.extract_store_offers, text)
+
+@pytest.mark.parametrize("parser,scoped", [("html.parser", False), ("html.parser", True), (None, False), (None, True)])
+def test_bench_page_text_on_large_page(benchmark, parser, scoped):
+    body = synthetic_pages()["synthetic-300-offers"]
+    resp = SimpleNamespace(content=body, text=body.decode("utf-8"), headers={"Content-Type": "text/html; charset=utf-8"})
+    ks.configure_parser(parser, scoped=scoped)
+    offers = benchmark(lambda: ks.extract_store_offers(ks.parse_page(resp).text("kupi")))
+    assert offers == ks.extract_store_offers(BeautifulSoup(body, "html.parser").get_text())
+
+@pytest.mark.parametrize("parser,scoped", [(None, False), ("html.parser", True), (None, True)])
+def test_parse_modes_match_legacy(site, slugs, queries, parser, scoped):
+    def run():
+        return [ks.scrape_kupi_sleva(s) for s in slugs], [ks.scrape_iletaky(q) for q in queries]
+    ks.configure_parser("html.parser", scoped=False)
+    legacy = run()
+    ks.configure_parser(parser, scoped=scoped)
+    assert run() == legacy
+
+def test_bench_scrape_kupi_sleva(benchmark, site, slugs):
+    results = benchmark(lambda: [ks.scrape_kupi_sleva(s) for s in slugs])
+    assert all(d["name"] for d in results)
+
+def test_bench_cross_verify(benchmark, site, queries):
+    results = benchmark.pedantic(lambda: [ks.cross_verify(q, 100.0) for q in queries], setup=ks._verify_memo.clear, rounds=10)
+    assert all(v["other_sources"] for v in results)
+
+def test_bench_save_results(benchmark, site, slugs, tmp_path):
+    products = [build_product(ks.scrape_kupi_sleva(s)) for s in slugs]
+    benchmark(ks.save_results, products, str(tmp_path), history=False)
+    saved = ks.load_previous(str(tmp_path))
+    assert json.loads(json.dumps(products)) == saved["products"]
+    assert list(ks.read_jsonl(str(tmp_path / "products.jsonl"))) == saved["products"]
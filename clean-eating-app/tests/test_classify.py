@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+import kupi_scraper as ks
+
+# pôvodné implementácie (substring cez zoznamy v poradí), voči ktorým sa overuje Aho-Corasick matcher
+
+def legacy_is_clean(name):
+    nl = name.lower()
+    return not any(b in nl for b in ks.BANNED_KEYWORDS)
+
+def legacy_is_priority(name):
+    nl = name.lower()
+    return any(k.lower() in nl for k in ks.PRIORITY_KEYWORDS)
+
+def legacy_get_clean_category(name):
+    nl = name.lower()
+    for cat, kws in ks.CATEGORY_KEYWORDS.items():
+        if any(kw in nl for kw in kws): return cat
+    return "other"
+
+def legacy_get_bio_audit(name, cat):
+    nl = name.lower()
+    for kw, d in ks.BIO.get(cat, {}).items():
+        if kw in nl:
+            return d[0], {"microbiome": {"score": d[1], "detail": d[4]}, "cardiovascular": {"score": d[2], "detail": d[5]}, "metabolism": {"score": d[3], "detail": d[6]}}
+    defaults = {"meat": 75, "fish": 90, "dairy": 85, "produce": 100, "pantry": 80, "other": 60}
+    return defaults.get(cat, 70), {"microbiome": {"score": 7, "detail": "Standardní produkt"}, "cardiovascular": {"score": 7, "detail": "Neutrální vliv"}, "metabolism": {"score": 7, "detail": "Standardní nutriční profil"}}
+
+def legacy_get_nutrition(name):
+    nl = name.lower()
+    for kw, n in ks.NUTRI.items():
+        if kw in nl: return {"kcal": n[0], "protein": n[1], "carbs": n[2], "fat": n[3], "fiber": n[4]}
+    return {"kcal": 0, "protein": 0, "carbs": 0, "fat": 0, "fiber": 0}
+
+def random_names(n, seed=0):
+    rnd = random.Random(seed)
+    words = list(ks.BANNED_KEYWORDS) + list(ks.PRIORITY_KEYWORDS) + [kw for kws in ks.CATEGORY_KEYWORDS.values() for kw in kws]
+    words += [kw for tpls in ks.BIO.values() for kw in tpls] + list(ks.NUTRI)
+    words += [slug.replace("-", " ") for slugs in ks.SLUGS.values() for slug in slugs]
+    letters = "abcdeéěfghiíjklmnoópqrřsštuúůvwxyýzžčď "
+    for _ in range(n):
+        parts = []
+        for _ in range(rnd.randint(1, 4)):
+            r = rnd.random()
+            if r < 0.6: w = rnd.choice(words)
+            elif r < 0.8: w = rnd.choice(words)[: rnd.randint(1, 6)] + "".join(rnd.choice(letters) for _ in range(rnd.randint(0, 4)))
+            else: w = "".join(rnd.choice(letters) for _ in range(rnd.randint(2, 10)))
+            parts.append(w.upper() if rnd.random() < 0.1 else (w.capitalize() if rnd.random() < 0.3 else w))
+        yield rnd.choice(["", "", "  "]).join(parts) if rnd.random() < 0.2 else " ".join(parts) + rnd.choice(["", " 500 g", " 1 kg", " 10 ks"])
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_matcher_equals_legacy_on_random_names(seed):
+    for name in random_names(10000, seed):
+        cat = legacy_get_clean_category(name)
+        assert ks.is_clean(name) == legacy_is_clean(name), name
+        assert ks.is_priority(name) == legacy_is_priority(name), name
+        assert ks.get_clean_category(name) == cat, name
+        assert ks.get_bio_audit(name, cat) == legacy_get_bio_audit(name, cat), name
+        assert ks.get_nutrition(name) == legacy_get_nutrition(name), name
+
+@pytest.mark.parametrize("name,clean,priority,category", [
+    ("Kuřecí prsní řízky", True, True, "meat"),
+    ("Kuřecí párky", False, False, "meat"),
+    ("Losos obecný filety", True, True, "fish"),
+    ("Mléčná čokoláda", False, False, "other"),
+    ("Olivový olej extra virgin", True, True, "pantry"),
+    ("Toaletní papír", True, False, "other"),
+])
+def test_known_names(name, clean, priority, category):
+    assert (ks.is_clean(name), ks.is_priority(name), ks.get_clean_category(name)) == (clean, priority, category)
@@ -0,0 +1,62 @@
+import json
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+import pytest
+
+import kupi_scraper as ks
+
+@pytest.fixture
+def cache(site, tmp_path):
+    site.log.clear()
+    ks.METRICS.reset()
+    yield ks.configure_cache(str(tmp_path))
+    ks.configure_cache(None)
+
+def kupi_url(slug):
+    return f"{ks.BASE_URLS['kupi']}/sleva/{slug}"
+
+def test_fresh_cache_hit_skips_network(cache, site, slugs):
+    url = kupi_url(slugs[0])
+    first = ks.fetch(url)
+    assert first.status_code == 200 and first.headers["ETag"]
+    second = ks.fetch(url)
+    assert second.status_code == 200 and second.content == first.content
+    assert [status for _, status in site.log] == [200]
+    host = ks.METRICS.to_dict()["hosts"][urlparse(url).netloc]
+    assert host["cache_hits"] == 1 and host["requests"] == 1
+
+def test_expired_entry_revalidates_with_etag(cache, site, slugs):
+    url = kupi_url(slugs[0])
+    body = ks.fetch(url).content
+    meta, _ = cache.load(url)
+    cache.touch(url, meta, datetime.now() - timedelta(minutes=1))
+    r = ks.fetch(url)
+    assert r.status_code == 200 and r.content == body
+    assert [status for _, status in site.log] == [200, 304]
+    meta, _ = cache.load(url)
+    assert meta["expires_at"] > datetime.now().isoformat()
+
+def test_changed_page_replaces_cached_body(cache, site, slugs):
+    url = kupi_url(slugs[0])
+    ks.fetch(url)
+    mp, bp = cache._files(url)
+    with open(mp, encoding="utf-8") as f: meta = json.load(f)
+    meta.update(etag='"stale"', expires_at=(datetime.now() - timedelta(minutes=1)).isoformat())
+    with open(mp, "w", encoding="utf-8") as f: json.dump(meta, f)
+    with open(bp, "wb") as f: f.write(b"old")
+    assert ks.fetch(url).content != b"old"
+    assert cache.load(url)[1] != b"old"
+    assert [status for _, status in site.log] == [200, 200]
+
+def test_offline_serves_cache_and_504_on_miss(cache, site, slugs):
+    url = kupi_url(slugs[0])
+    body = ks.fetch(url).content
+    ks.configure_cache(cache.path, offline=True)
+    assert ks.fetch(url).content == body
+    assert ks.fetch(kupi_url(slugs[1])).status_code == 504
+    assert [status for _, status in site.log] == [200]
+
+def test_offline_requires_cache_dir():
+    with pytest.raises(ValueError):
+        ks.configure_cache(None, offline=True)
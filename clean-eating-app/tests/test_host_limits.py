@@ -0,0 +1,20 @@
+import pytest
+
+import kupi_scraper as ks
+
+@pytest.mark.parametrize("spec,expected", [
+    ("www.kupi.cz=4:3", ("www.kupi.cz", 4.0, 3)),
+    ("www.kupi.cz=4", ("www.kupi.cz", 4.0, None)),
+    ("www.kupi.cz=:3", ("www.kupi.cz", None, 3)),
+    ("127.0.0.1:8000=0:8", ("127.0.0.1:8000", 0.0, 8)),
+])
+def test_parse_host_limit(spec, expected):
+    assert ks.parse_host_limit(spec) == expected
+
+@pytest.mark.parametrize("spec", ["www.kupi.cz", "www.kupi.cz=", "=3:2", "www.kupi.cz=abc", "www.kupi.cz=2:x", "www.kupi.cz=2:0", "www.kupi.cz=-1"])
+def test_parse_host_limit_rejects(spec):
+    with pytest.raises(ValueError):
+        ks.parse_host_limit(spec)
+
+def test_defaults_are_conservative():
+    assert ks.HOST_LIMITS["www.kupi.cz"]["rps"] <= 2 and ks.HOST_LIMITS["www.kupi.cz"]["concurrency"] <= 2
@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+
+import kupi_scraper as ks
+from bench_scraper import build_product
+
+SCRAPER_DIR = os.path.dirname(os.path.abspath(ks.__file__))
+# celý beh v samostatnom procese nad serverom z testu (rovnaké URL v oboch behoch), SLUGS zúžené na stránky z fixtures;
+# previous dostane len StreamWriter: všetky produkty sa stiahnu znova (ako pri neplatných ponukách) a porovnajú s predošlým behom
+RUN = """
+import sys
+from types import SimpleNamespace
+import kupi_scraper as ks
+from fixture_pages import kupi_pages, load_pages, point_scraper_at
+point_scraper_at(SimpleNamespace(server_address=("127.0.0.1", int(sys.argv[2]))))
+found = set(kupi_pages(load_pages()))
+for cat in ks.SLUGS: ks.SLUGS[cat] = [s for s in ks.SLUGS[cat] if s in found]
+writer = ks.StreamWriter(sys.argv[1], previous=ks.load_previous(sys.argv[1]) or {"products": []}, history=False)
+ks.run_full_scrape(writer=writer)
+writer.close()
+"""
+
+def scrape(site, out, seed):
+    # iný PYTHONHASHSEED = iné poradie množín, ako pri dvoch behoch v CI
+    env = dict(os.environ, PYTHONHASHSEED=str(seed), PYTHONPATH=SCRAPER_DIR)
+    proc = subprocess.run([sys.executable, "-c", RUN, str(out), str(site.server_address[1])], env=env, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stdout + proc.stderr
+    return ks.load_json(os.path.join(out, "changes.json"))
+
+def test_rescrape_in_another_process_is_unchanged(site, tmp_path):
+    scrape(site, tmp_path, seed=1)
+    changes = scrape(site, tmp_path, seed=2)
+    assert (changes["added"], changes["updated"], changes["removed"]) == ([], [], [])
+    assert changes["unchanged"] == len(ks.load_previous(str(tmp_path))["products"]) > 0
+
+def test_changes_carry_only_referenced_lookups_and_dropped_categories(site, slugs, tmp_path):
+    products = [build_product(ks.scrape_kupi_sleva(s)) for s in slugs]
+    ks.save_results(products, str(tmp_path), history=False)
+    assert (tmp_path / "products_fish.json").exists()
+    # ryby (len losos) z ponuky zmiznú, brokolica zlacnie
+    kept = [dict(p) for p in products if p["category"] != "fish"]
+    broc = next(p for p in kept if p["slug"] == "brokolice")
+    broc["best_price"] -= 1
+    ks.save_results(kept, str(tmp_path), previous=ks.load_previous(str(tmp_path)), history=False)
+
+    changes = ks.load_json(str(tmp_path / "changes.json"))
+    assert not (tmp_path / "products_fish.json").exists()
+    assert changes["changed_categories"] == ["fish", "produce"]
+    assert changes["removed"] == ["losos-filety"]
+    assert [p["slug"] for p in changes["updated"]] == ["brokolice"]
+    assert changes["lookups"] == {"bio": {ks.bio_key(broc["name"], broc["category"]): broc["bio_audit"]},
+                                  "nutrition": {ks.nutrition_key(broc["name"]): broc["nutrition"]}}
@@ -0,0 +1,72 @@
+import json
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+import price_history as ph
+
+def day(ago):
+    return (date.today() - timedelta(days=ago)).isoformat()
+
+def product(name, offers, regular=200.0, verification=None):
+    return {"name": name, "slug": "kureci-prsa", "category": "meat", "is_priority": True, "regular_price": regular,
+            "best_price": min(o["sale_price"] for o in offers), "max_discount": 50, "verification": verification,
+            "offers": [dict(o, source="kupi.cz") for o in offers]}
+
+OLD = {"store": "Lidl", "sale_price": 100.0, "valid_from": day(70), "valid_until": day(64)}
+KAUFLAND = {"store": "Kaufland", "sale_price": 150.0, "valid_from": day(14), "valid_until": day(8)}
+NEW = {"store": "Lidl", "sale_price": 120.0, "unit": "1 kg", "valid_from": day(3), "valid_until": day(-3)}
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / ph.DB_NAME)
+    # druhý beh: Kaufland ponuka je v letáku stále (rovnaký riadok), pribudne nová v Lidli, zmení sa názov
+    assert ph.record_run(path, [product("Kuřecí prsa", [OLD, KAUFLAND])], generated_at="2026-01-01T06:00:00") == 1
+    ver = {"kupi_price": 120.0, "verified": True, "confidence": "high", "other_sources": [{"source": "iletaky.cz", "price": 119.9}]}
+    assert ph.record_run(path, iter([product("Kuřecí prsa chlazená", [KAUFLAND, NEW], verification=ver)]), generated_at="2026-01-08T06:00:00", flyer_week="08.01 – 14.01.2026") == 2
+    conn = ph.connect(path, readonly=True)
+    yield conn
+    conn.close()
+
+def test_products_upsert_keeps_first_seen(db):
+    assert db.execute("SELECT name, first_seen, last_seen FROM products").fetchall() == [("Kuřecí prsa chlazená", "2026-01-01T06:00:00", "2026-01-08T06:00:00")]
+    assert db.execute("SELECT run_id, best_price FROM snapshots ORDER BY run_id").fetchall() == [(1, 100.0), (2, 120.0)]
+
+def test_repeated_offer_is_stored_once(db):
+    rows = db.execute("SELECT run_id, store, sale_price, unit FROM offers ORDER BY valid_from").fetchall()
+    assert rows == [(1, "Lidl", 100.0, None), (1, "Kaufland", 150.0, None), (2, "Lidl", 120.0, "1 kg")]
+
+def test_verification_is_recorded(db):
+    run_id, verified, sources = db.execute("SELECT run_id, verified, other_sources FROM verification").fetchone()
+    assert (run_id, verified, json.loads(sources)) == (2, 1, [{"source": "iletaky.cz", "price": 119.9}])
+
+def test_price_trend(db):
+    assert ph.price_trend(db, "kureci-prsa") == [{"valid_from": day(70), "min_price": 100.0, "offers": 1},
+                                                 {"valid_from": day(14), "min_price": 150.0, "offers": 1},
+                                                 {"valid_from": day(3), "min_price": 120.0, "offers": 1}]
+    assert [t["valid_from"] for t in ph.price_trend(db, "kureci-prsa", weeks=8)] == [day(14), day(3)]
+    assert ph.price_trend(db, "losos-filety") == []
+
+def test_lowest_price_in_last_weeks(db):
+    assert ph.lowest_price(db, "kureci-prsa", weeks=12) == {"slug": "kureci-prsa", "weeks": 12, "price": 100.0, "store": "Lidl", "valid_from": day(70)}
+    assert ph.lowest_price(db, "kureci-prsa", weeks=8)["price"] == 120.0
+    assert ph.lowest_price(db, "losos-filety") is None
+
+def test_is_deal(db):
+    assert ph.is_deal(db, "kureci-prsa", 119.9)
+    assert ph.is_deal(db, "kureci-prsa", 120.0)
+    assert not ph.is_deal(db, "kureci-prsa", 125.0)
+    assert not ph.is_deal(db, "kureci-prsa", 110.0, weeks=12)
+    assert ph.is_deal(db, "losos-filety", 999.0)
+
+def test_store_avg_discount(db):
+    assert ph.store_avg_discount(db) == [{"store": "Lidl", "avg_discount": 45.0, "offers": 2}, {"store": "Kaufland", "avg_discount": 25.0, "offers": 1}]
+    assert ph.store_avg_discount(db, weeks=8) == [{"store": "Lidl", "avg_discount": 40.0, "offers": 1}, {"store": "Kaufland", "avg_discount": 25.0, "offers": 1}]
+
+def test_readonly_connect(db, tmp_path):
+    with pytest.raises(sqlite3.OperationalError):
+        db.execute("DELETE FROM offers")
+    with pytest.raises(FileNotFoundError):
+        ph.connect(str(tmp_path / "missing.sqlite"), readonly=True)
+    assert not (tmp_path / "missing.sqlite").exists()
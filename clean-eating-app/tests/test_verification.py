@@ -0,0 +1,81 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import kupi_scraper as ks
+
+# (slug zo SLUGS, názov z kupi.cz, dotaz na iLetaky/AkcniCeny)
+QUERIES = [
+    ("losos-filety", "Losos filety", "losos"),
+    ("losos-obecny-filety", "Losos obecný filety", "losos"),
+    ("tvaroh-jihocesky-madeta", "Tvaroh jihočeský Madeta 250 g", "tvaroh jihočeský madeta"),
+    ("tvaroh-polotucny-jihocesky-madeta", "Tvaroh polotučný jihočeský Madeta 250g", "tvaroh jihočeský madeta"),
+    ("tvaroh-tucny-karlova-koruna", "Tvaroh tučný Karlova Koruna", "tvaroh karlova koruna"),
+    ("olivovy-olej-extra-virgin", "Olivový olej extra virgin 1 litr", "olivový olej extra virgin litr"),
+    ("olivovy-olej-bertolli", "Olivový olej Bertolli 0,5 l", "olivový olej bertolli"),
+    ("kureci-prsa", "Kuřecí prsa chlazená 1 kg", "kuřecí prsa"),
+    ("vejce-m", "Vejce M 10 ks", "vejce m"),
+    ("jogurt-recky", "Jogurt řecký 10%", "jogurt řecký"),
+    ("maslo-ceske", "Máslo české 82% 250 g", "máslo české"),
+    ("mozzarella-galbani", "Mozzarella Galbani 125g", "mozzarella galbani"),
+]
+
+@pytest.mark.parametrize("slug,name,query", QUERIES)
+def test_normalize_query(slug, name, query):
+    assert slug in {s for slugs in ks.SLUGS.values() for s in slugs}
+    assert ks.normalize_query(name) == query
+
+def test_unit_needs_word_boundary():
+    # „1 litr“ nie je „1 l“ + „itr“
+    assert ks.normalize_query("Olej 1 litr") == "olej litr"
+    assert ks.normalize_query("Olej 1 l") == "olej"
+
+@pytest.fixture
+def vcache(site, tmp_path):
+    site.log.clear()
+    yield ks.configure_cache(str(tmp_path))
+    ks.configure_cache(None)
+    ks._verify_memo.clear()
+
+def verify_cache_file(cache):
+    return os.path.join(cache.path, "verify_cache.json")
+
+def write_verify_cache(cache, expires_at, queries):
+    with open(verify_cache_file(cache), "w", encoding="utf-8") as f: json.dump({"expires_at": expires_at.isoformat(), "queries": queries}, f)
+
+def test_variants_share_one_lookup(site):
+    site.log.clear()
+    first = ks.verify_batch([("Losos filety", 299.9), ("Losos obecný filety", 249.9)])
+    assert sorted(path for path, _ in site.log) == ["/www.akcniceny.cz/hledani/?q=losos", "/www.iletaky.cz/hledani/?q=losos"]
+    assert first[0]["other_sources"] == first[1]["other_sources"] != []
+    # druhý beh v tom istom procese: všetko z _verify_memo
+    ks.cross_verify("Losos filety", 299.9)
+    assert len(site.log) == 2
+
+def test_verify_cache_saved_until_next_flyer_change(vcache, site):
+    found = ks.lookup_sources(["losos", "vejce m"])
+    with open(verify_cache_file(vcache), encoding="utf-8") as f: saved = json.load(f)
+    assert saved == {"expires_at": ks.next_flyer_change().isoformat(), "queries": found}
+
+def test_valid_verify_cache_replaces_network(vcache, site):
+    write_verify_cache(vcache, datetime.now() + timedelta(days=1), {"losos": [{"source": "iletaky.cz", "price": 1.5}]})
+    assert ks.cross_verify("Losos filety", 1.5)["other_sources"] == [{"source": "iletaky.cz", "price": 1.5}]
+    assert site.log == []
+
+def test_expired_verify_cache_is_ignored(vcache, site):
+    write_verify_cache(vcache, datetime.now() - timedelta(minutes=1), {"losos": [{"source": "iletaky.cz", "price": 1.5}]})
+    v = ks.cross_verify("Losos filety", 299.9)
+    assert {"source": "iletaky.cz", "price": 1.5} not in v["other_sources"] and v["other_sources"]
+    assert len(site.log) == 2
+    with open(verify_cache_file(vcache), encoding="utf-8") as f: saved = json.load(f)
+    assert saved["expires_at"] > datetime.now().isoformat() and saved["queries"]["losos"] == v["other_sources"]
+
+def test_offline_run_does_not_write_verify_cache(vcache, site):
+    found = ks.lookup_sources(["losos"])
+    os.remove(verify_cache_file(vcache))
+    ks._verify_memo.clear()
+    ks.configure_cache(vcache.path, offline=True)
+    assert ks.lookup_sources(["losos"]) == found
+    assert not os.path.exists(verify_cache_file(vcache))